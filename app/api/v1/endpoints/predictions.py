@@ -2,22 +2,30 @@
 Endpoints para predicciones de riesgos obstétricos
 """
 import logging
-from typing import List
+import numpy as np
+import orjson
 from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import StreamingResponse
 
 from app.schemas.prediction import (
     PatientData,
     PredictionResponse,
     BatchPredictionRequest,
-    BatchPredictionResponse
+    BatchPredictionResponse,
+    SingleRiskResponse
 )
 from app.services.prediction_service import PredictionService
+from app.services.executor import run_prediction
+from app.services.batcher import batcher
 from app.core.config import settings
 
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Pacientes evaluados por bloque en /predict/batch/stream
+STREAM_CHUNK_SIZE = 16
+
 
 @router.post(
     "/predict",
@@ -48,7 +56,12 @@ async def predict_patient(patient_data: PatientData) -> PredictionResponse:
     try:
         logger.info(f"Recibida petición de predicción: edad={patient_data.edad_materna}, semanas={patient_data.semanas_gestacion}")
         
-        result = PredictionService.predict_all_risks(patient_data)
+        if batcher.running:
+            # Se agrupa con otras peticiones concurrentes en un micro-lote
+            result = await batcher.submit(patient_data)
+        else:
+            # La inferencia es síncrona (sklearn): se ejecuta fuera del event loop
+            result = await run_prediction(PredictionService.predict_all_risks, patient_data)
         
         logger.info(f"Predicción exitosa: riesgo_general={result.resumen['riesgo_general']}")
         return result
@@ -90,25 +103,15 @@ async def predict_batch(request: BatchPredictionRequest) -> BatchPredictionRespo
                 detail=f"Número de pacientes ({num_patients}) excede el límite máximo ({settings.MAX_BATCH_SIZE})"
             )
         
-        # Realizar predicciones para cada paciente
-        predictions = []
-        for i, patient_data in enumerate(request.pacientes):
-            try:
-                result = PredictionService.predict_all_risks(patient_data)
-                predictions.append(result)
-            except Exception as e:
-                logger.error(f"Error al predecir paciente {i+1}: {str(e)}")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Error al procesar paciente {i+1}: {str(e)}"
-                )
+        # Realizar predicciones de todo el lote en una sola pasada por modelo
+        predictions, levels = await run_prediction(PredictionService.predict_all_risks_batch, request.pacientes)
         
         # Calcular estadísticas del lote
-        stats = _calculate_batch_statistics(predictions)
+        stats = _calculate_batch_statistics(levels)
         
         logger.info(f"Lote procesado exitosamente: {num_patients} pacientes")
         
-        return BatchPredictionResponse(
+        return BatchPredictionResponse.model_construct(
             total_pacientes=num_patients,
             predicciones=predictions,
             estadisticas=stats
@@ -124,14 +127,74 @@ async def predict_batch(request: BatchPredictionRequest) -> BatchPredictionRespo
         )
 
 
+@router.post(
+    "/predict/batch/stream",
+    status_code=status.HTTP_200_OK,
+    summary="Predicción por lotes en streaming (NDJSON)",
+    description=f"Igual que /predict/batch (máximo {settings.MAX_BATCH_SIZE} pacientes), pero emite una línea JSON por paciente y una línea final con las estadísticas",
+    response_description="Flujo application/x-ndjson",
+    response_class=StreamingResponse
+)
+async def predict_batch_stream(request: BatchPredictionRequest) -> StreamingResponse:
+    """
+    Realiza predicciones por lotes y las devuelve como NDJSON.
+    
+    Los pacientes se evalúan en bloques de STREAM_CHUNK_SIZE y cada bloque se
+    envía en cuanto está listo.
+    
+    **Formato:**
+    - Una línea por paciente con la misma estructura que `/predict`
+    - Una línea final `{"estadisticas": {...}}`
+    - Si un bloque falla, una línea final `{"error": "...", "procesados": n}`
+      en lugar de las estadísticas
+    """
+    num_patients = len(request.pacientes)
+    logger.info(f"Recibida petición de lote (stream) con {num_patients} pacientes")
+    
+    if num_patients > settings.MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Número de pacientes ({num_patients}) excede el límite máximo ({settings.MAX_BATCH_SIZE})"
+        )
+    
+    async def generate():
+        # Cada bloque se evalúa y se emite antes de pasar al siguiente
+        levels_chunks = []
+        for start in range(0, num_patients, STREAM_CHUNK_SIZE):
+            chunk = request.pacientes[start:start + STREAM_CHUNK_SIZE]
+            try:
+                predictions, levels = await run_prediction(PredictionService.predict_all_risks_batch, chunk)
+            except Exception as e:
+                # La respuesta ya empezó (200): el error se informa como última línea
+                logger.error(f"Error en predicción por lote (stream): {str(e)}", exc_info=True)
+                yield orjson.dumps({
+                    "error": f"Error al realizar predicción por lote: {str(e)}",
+                    "procesados": start
+                }) + b"\n"
+                return
+            
+            levels_chunks.append(levels)
+            for prediction in predictions:
+                yield orjson.dumps(prediction.model_dump(mode='json', by_alias=True)) + b"\n"
+        
+        levels = (
+            np.concatenate(levels_chunks) if levels_chunks
+            else np.empty((0, len(PredictionService.RISK_TYPES)), dtype=np.int8)
+        )
+        yield orjson.dumps({"estadisticas": _calculate_batch_statistics(levels)}) + b"\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
 @router.post(
     "/predict/risk/{risk_type}",
+    response_model=SingleRiskResponse,
     status_code=status.HTTP_200_OK,
     summary="Predicción de un riesgo específico",
     description="Realiza predicción para un tipo de riesgo específico",
     response_description="Predicción del riesgo solicitado"
 )
-async def predict_single_risk(risk_type: str, patient_data: PatientData):
+async def predict_single_risk(risk_type: str, patient_data: PatientData) -> SingleRiskResponse:
     """
     Predice un riesgo específico para un paciente.
     
@@ -151,12 +214,12 @@ async def predict_single_risk(risk_type: str, patient_data: PatientData):
         
         logger.info(f"Predicción de riesgo específico: {risk_type}")
         
-        prediction = PredictionService.predict_single_risk(patient_data, risk_type)
+        prediction = await run_prediction(PredictionService.predict_single_risk, patient_data, risk_type)
         
-        return {
-            "prediccion": prediction.model_dump(by_alias=True),
-            "datos_paciente": patient_data.model_dump(by_alias=True)
-        }
+        return SingleRiskResponse.model_construct(
+            prediccion=prediction,
+            datos_paciente=patient_data
+        )
         
     except HTTPException:
         raise
@@ -168,49 +231,37 @@ async def predict_single_risk(risk_type: str, patient_data: PatientData):
         )
 
 
-def _calculate_batch_statistics(predictions: List[PredictionResponse]) -> dict:
+def _calculate_batch_statistics(levels: np.ndarray) -> dict:
     """
     Calcula estadísticas agregadas de un lote de predicciones
     
     Args:
-        predictions: Lista de predicciones
+        levels: Códigos de nivel de riesgo (N, 3) devueltos por PredictionService.score_batch
         
     Returns:
         Diccionario con estadísticas
     """
-    total = len(predictions)
+    total = len(levels)
+    
+    # Riesgo general por paciente = nivel máximo entre los 3 riesgos
+    general = levels.max(axis=1)
+    distribution = np.bincount(general, minlength=len(PredictionService.RISK_LEVEL_NAMES))
+    
+    # Misma regla que PredictionService.generate_summary: algún riesgo alto o >= 2 moderados
+    special_attention = (levels == 3).any(axis=1) | ((levels == 2).sum(axis=1) >= 2)
+    require_special_attention = int(special_attention.sum())
+    
+    high_by_type = (levels == 3).sum(axis=0)
     
-    # Contadores por nivel de riesgo general
     risk_distribution = {
-        'alto': 0,
-        'moderado': 0,
-        'bajo': 0,
-        'muy_bajo': 0
+        name: int(distribution[code])
+        for code, name in reversed(list(enumerate(PredictionService.RISK_LEVEL_NAMES)))
     }
-    
-    # Contadores por tipo de riesgo
     risk_type_high = {
-        'sepsis': 0,
-        'hipertension_gestacional': 0,
-        'hemorragia_posparto': 0
+        risk_type: int(high_by_type[column])
+        for column, risk_type in enumerate(PredictionService.RISK_TYPES)
     }
     
-    require_special_attention = 0
-    
-    for pred_response in predictions:
-        # Distribución de riesgo general
-        general_risk = pred_response.resumen.get('riesgo_general', 'bajo')
-        risk_distribution[general_risk] += 1
-        
-        # Atención especial
-        if pred_response.resumen.get('requiere_atencion_especial', False):
-            require_special_attention += 1
-        
-        # Riesgos altos por tipo
-        for prediction in pred_response.predicciones:
-            if prediction.nivel_riesgo.value == 'alto':
-                risk_type_high[prediction.riesgo] += 1
-    
     return {
         'total_procesados': total,
         'distribucion_riesgo_general': risk_distribution,
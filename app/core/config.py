@@ -2,7 +2,8 @@
 Configuración central de la aplicación
 """
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from pydantic import field_validator, model_validator
+from pydantic import PrivateAttr, model_validator
+from functools import cached_property
 from pathlib import Path
 from typing import List, Dict
 import logging
@@ -21,6 +22,11 @@ class Settings(BaseSettings):
     API_VERSION: str = "1.0.0"
     API_PREFIX: str = "/api/v1"
     
+    # Entorno de ejecución: "development" activa la recarga automática en main()
+    ENVIRONMENT: str = "development"
+    # Procesos de uvicorn al ejecutar main() fuera de desarrollo
+    WEB_CONCURRENCY: int = 1
+    
     # CORS
     CORS_ORIGINS: List[str] = ["*"]  # En producción, especificar dominios permitidos
     CORS_CREDENTIALS: bool = True
@@ -42,6 +48,26 @@ class Settings(BaseSettings):
     # Límites
     MAX_BATCH_SIZE: int = 100
     
+    # Carga diferida: los modelos se cargan en segundo plano tras el arranque
+    LAZY_MODEL_LOADING: bool = False
+    
+    # Caché de predicciones (entradas por proceso; 0 desactiva la caché)
+    PREDICTION_CACHE_SIZE: int = 4096
+    
+    # Procesos dedicados a predicción (0 usa hilos del event loop)
+    PREDICTION_PROCESS_WORKERS: int = 0
+    
+    # Ruta rápida para pacientes sin factores de riesgo (solo si es exacta para los modelos cargados)
+    ENABLE_FAST_PATH: bool = True
+    
+    # Segmento de memoria compartida para los árboles compilados entre workers (vacío = desactivado)
+    SHARED_TREES_NAME: str = ""
+    
+    # Micro-lotes: agrupa peticiones individuales concurrentes en una sola evaluación
+    MICROBATCH_ENABLED: bool = False
+    MICROBATCH_MAX_SIZE: int = 64
+    MICROBATCH_MAX_WAIT_MS: float = 10.0
+    
     # Configuración de logging
     LOG_LEVEL: str = "INFO"
     
@@ -58,34 +84,25 @@ class Settings(BaseSettings):
         case_sensitive=True
     )
     
-    @field_validator('MODELS_DIR')
-    @classmethod
-    def validate_models_dir(cls, v: str, info) -> str:
-        """
-        Valida que el directorio de modelos existe
+    # Rutas resueltas por validate_model_files (se calculan una sola vez)
+    _models_path: Path = PrivateAttr()
+    _resolved_models: Dict[str, Path] = PrivateAttr(default_factory=dict)
+    
+    @model_validator(mode='after')
+    def validate_model_files(self) -> 'Settings':
         """
-        # Obtener BASE_DIR del contexto
-        base_dir = Path(__file__).resolve().parent.parent.parent
-        
-        # Construir la ruta completa
-        models_path = Path(v) if Path(v).is_absolute() else base_dir / v
+        Valida el directorio de modelos y que todos los archivos de modelos existen
         
-        # Verificar que existe
-        if not models_path.exists():
-            raise ValueError(f"El directorio de modelos no existe: {models_path}")
+        Cada ruta se consulta una única vez en el sistema de archivos y el
+        resultado queda guardado para models_path y models_config.
+        """
+        models_dir = Path(self.MODELS_DIR)
+        models_path = (models_dir if models_dir.is_absolute() else self.BASE_DIR / models_dir).resolve()
         
         if not models_path.is_dir():
-            raise ValueError(f"La ruta de modelos no es un directorio: {models_path}")
+            raise ValueError(f"El directorio de modelos no existe o no es un directorio: {models_path}")
         
         logger.info(f"✓ Directorio de modelos validado: {models_path}")
-        return str(v)
-    
-    @model_validator(mode='after')
-    def validate_model_files(self) -> 'Settings':
-        """
-        Valida que todos los archivos de modelos existen
-        """
-        models_path = Path(self.MODELS_DIR) if Path(self.MODELS_DIR).is_absolute() else self.BASE_DIR / self.MODELS_DIR
         
         model_files = {
             'sepsis': self.MODEL_SEPSIS,
@@ -93,37 +110,53 @@ class Settings(BaseSettings):
             'hemorragia_posparto': self.MODEL_HEMORRAGIA_POSPARTO
         }
         
+        resolved_models = {}
         missing_files = []
         for name, filename in model_files.items():
             model_path = models_path / filename
-            if not model_path.exists():
+            try:
+                model_path.stat()
+            except OSError:
                 missing_files.append(f"{name}: {filename}")
             else:
+                resolved_models[name] = model_path
                 logger.info(f"✓ Modelo encontrado: {name} -> {model_path}")
         
         if missing_files:
             raise ValueError(f"Archivos de modelo faltantes:\n" + "\n".join(f"  - {f}" for f in missing_files))
         
+        self._models_path = models_path
+        self._resolved_models = resolved_models
+        return self
+    
+    @model_validator(mode='after')
+    def validate_thresholds(self) -> 'Settings':
+        """
+        Valida que los umbrales de clasificación estén ordenados
+        
+        PredictionService clasifica el nivel de riesgo con una búsqueda binaria
+        sobre los umbrales, por lo que deben ser crecientes.
+        """
+        if not (self.UMBRAL_RIESGO_BAJO <= self.UMBRAL_RIESGO_MODERADO <= self.UMBRAL_RIESGO_ALTO):
+            raise ValueError(
+                "Los umbrales de riesgo deben cumplir "
+                "UMBRAL_RIESGO_BAJO <= UMBRAL_RIESGO_MODERADO <= UMBRAL_RIESGO_ALTO"
+            )
         return self
     
-    @property
+    @cached_property
     def models_path(self) -> Path:
         """
-        Retorna la ruta completa al directorio de modelos
+        Retorna la ruta completa al directorio de modelos (resuelta al validar)
         """
-        models_dir = Path(self.MODELS_DIR) if Path(self.MODELS_DIR).is_absolute() else self.BASE_DIR / self.MODELS_DIR
-        return models_dir.resolve()
+        return self._models_path
     
-    @property
+    @cached_property
     def models_config(self) -> Dict[str, Path]:
         """
-        Retorna un diccionario con las rutas completas de cada modelo
+        Retorna un diccionario con las rutas completas de cada modelo (resueltas al validar)
         """
-        return {
-            'sepsis': self.models_path / self.MODEL_SEPSIS,
-            'hipertension_gestacional': self.models_path / self.MODEL_HIPERTENSION_GESTACIONAL,
-            'hemorragia_posparto': self.models_path / self.MODEL_HEMORRAGIA_POSPARTO
-        }
+        return dict(self._resolved_models)
 
 
 # Instancia global de settings
@@ -1,17 +1,85 @@
 """
 Eventos del ciclo de vida de la aplicación
 """
+import asyncio
 import logging
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from app.core.config import settings
 from app.services.ml_services import ModelLoader, get_model_info
+from app.services.prediction_service import PredictionService
+from app.services.executor import start_executor, shutdown_executor
+from app.services.batcher import batcher
+from app.services._numba_kernels import warmup as warmup_kernels
+from app.services._tree_kernel import warmup as warmup_tree_kernel
 
 
 logger = logging.getLogger(__name__)
 
 
+# Tarea de precarga en segundo plano (LAZY_MODEL_LOADING)
+_warmup_task: Optional[asyncio.Task] = None
+
+
+def _preload_models() -> None:
+    """
+    Pre-carga los modelos en memoria (o adjunta los árboles compartidos)
+    """
+    logger.info("\n⚡ PRE-CARGA DE MODELOS EN MEMORIA")
+    logger.info("-" * 80)
+    
+    try:
+        if ModelLoader.attach_shared_trees():
+            # Otro worker ya publicó los árboles: no hace falta cargar los modelos
+            logger.info("✓ Árboles compilados adjuntados desde memoria compartida")
+            logger.info("  └─ Los modelos se cargarán bajo demanda")
+        else:
+            # Cargar todos los modelos
+            models = ModelLoader.load_all_models()
+            
+            logger.info(f"✓ Modelos cargados exitosamente en memoria:")
+            for model_name, model in models.items():
+                model_type = type(model).__name__
+                logger.info(f"  └─ '{model_name}': {model_type}")
+        
+        # Verificar caché
+        logger.info(f"✓ Modelos en caché: {ModelLoader.cached_count()}")
+        
+    except Exception as e:
+        logger.error(f"✗ Error al pre-cargar modelos: {str(e)}")
+        raise
+
+
+def _compile_kernels() -> None:
+    """
+    Compila los kernels numéricos y prepara los árboles y la ruta rápida
+    """
+    logger.info("\n🧮 COMPILANDO KERNELS NUMÉRICOS")
+    logger.info("-" * 80)
+    
+    try:
+        warmup_kernels()
+        warmup_tree_kernel()
+        ModelLoader.get_compiled_trees()
+        PredictionService.get_fast_path()
+    except Exception as e:
+        logger.error(f"✗ Error al compilar kernels: {str(e)}")
+        raise
+
+
+async def _warm_up_in_background() -> None:
+    """
+    Ejecuta la pre-carga y la compilación sin bloquear el arranque
+    """
+    try:
+        await asyncio.to_thread(_preload_models)
+        await asyncio.to_thread(_compile_kernels)
+        logger.info("✓ Pre-carga en segundo plano completada")
+    except Exception as e:
+        logger.error(f"✗ Error en la pre-carga en segundo plano: {str(e)}")
+
+
 async def startup_event() -> None:
     """
     Evento de inicio de la aplicación.
@@ -19,8 +87,10 @@ async def startup_event() -> None:
     Realiza las siguientes tareas:
     1. Verifica el directorio de modelos
     2. Valida la existencia de archivos de modelos
-    3. Pre-carga todos los modelos en memoria
-    4. Registra información del sistema
+    3. Pre-carga todos los modelos en memoria (en segundo plano si LAZY_MODEL_LOADING)
+    4. Compila los kernels numéricos (si Numba está disponible)
+    5. Inicia el pool de procesos y los micro-lotes (si están habilitados)
+    6. Registra información del sistema
     """
     logger.info("=" * 80)
     logger.info("🚀 INICIANDO APLICACIÓN")
@@ -38,7 +108,7 @@ async def startup_event() -> None:
             raise FileNotFoundError(f"Directorio de modelos no encontrado: {models_path}")
         
         logger.info(f"✓ Directorio de modelos encontrado: {models_path}")
-        logger.info(f"  └─ Ruta absoluta: {models_path.resolve()}")
+        logger.info(f"  └─ Ruta absoluta: {models_path}")
         
         # Listar archivos en el directorio
         model_files = list(models_path.glob("*.joblib"))
@@ -73,28 +143,33 @@ async def startup_event() -> None:
         logger.error(f"✗ Error al validar archivos de modelos: {str(e)}")
         raise
     
-    # 3. Pre-carga de modelos en memoria
-    logger.info("\n⚡ PRE-CARGA DE MODELOS EN MEMORIA")
+    # 3-4. Pre-carga de modelos y compilación de kernels
+    if settings.LAZY_MODEL_LOADING:
+        global _warmup_task
+        logger.info("\n⚡ CARGA DIFERIDA DE MODELOS")
+        logger.info("-" * 80)
+        _warmup_task = asyncio.create_task(_warm_up_in_background())
+        logger.info("✓ Los modelos y kernels se preparan en segundo plano")
+        logger.info("  └─ Las peticiones que lleguen antes los cargan bajo demanda")
+    else:
+        _preload_models()
+        _compile_kernels()
+    
+    # 5. Pool de procesos de predicción
+    logger.info("\n⚙️  EJECUTOR DE PREDICCIONES")
     logger.info("-" * 80)
     
     try:
-        # Cargar todos los modelos
-        models = ModelLoader.load_all_models()
-        
-        logger.info(f"✓ Modelos cargados exitosamente en memoria:")
-        for model_name, model in models.items():
-            model_type = type(model).__name__
-            logger.info(f"  └─ '{model_name}': {model_type}")
-        
-        # Verificar caché
-        cached_models = ModelLoader.get_cached_models()
-        logger.info(f"✓ Modelos en caché: {len(cached_models)}")
+        if start_executor() is None:
+            logger.info("✓ Predicciones en hilos del event loop")
         
+        if settings.MICROBATCH_ENABLED:
+            batcher.start()
     except Exception as e:
-        logger.error(f"✗ Error al pre-cargar modelos: {str(e)}")
+        logger.error(f"✗ Error al iniciar el pool de procesos: {str(e)}")
         raise
     
-    # 4. Información del sistema
+    # 6. Información del sistema
     logger.info("\n📊 INFORMACIÓN DEL SISTEMA")
     logger.info("-" * 80)
     logger.info(f"API: {settings.API_TITLE}")
@@ -102,6 +177,7 @@ async def startup_event() -> None:
     logger.info(f"Prefijo API: {settings.API_PREFIX}")
     logger.info(f"Log Level: {settings.LOG_LEVEL}")
     logger.info(f"Max Batch Size: {settings.MAX_BATCH_SIZE}")
+    logger.info(f"Procesos de predicción: {settings.PREDICTION_PROCESS_WORKERS}")
     
     logger.info("\n🎯 UMBRALES DE CLASIFICACIÓN")
     logger.info("-" * 80)
@@ -131,11 +207,19 @@ async def shutdown_event() -> None:
     logger.info("-" * 80)
     
     try:
-        cached_models = ModelLoader.get_cached_models()
-        logger.info(f"Limpiando {len(cached_models)} modelos del caché...")
+        # Primero se detiene lo que puede seguir usando los modelos
+        if _warmup_task is not None and not _warmup_task.done():
+            _warmup_task.cancel()
+        await batcher.stop()
+        shutdown_executor()
+        
+        logger.info(f"Limpiando {ModelLoader.cached_count()} modelos del caché...")
         ModelLoader.clear_cache()
         logger.info("✓ Caché de modelos limpiado")
         
+        PredictionService.cache_clear()
+        logger.info("✓ Caché de predicciones limpiado")
+        
     except Exception as e:
         logger.error(f"✗ Error al limpiar recursos: {str(e)}")
     
@@ -160,7 +244,7 @@ def get_startup_info() -> Dict[str, Any]:
         "models": {
             "directory": str(settings.models_path),
             "models_info": get_model_info(),
-            "cached_models": list(ModelLoader.get_cached_models().keys())
+            "cached_models": ModelLoader.cached_names()
         },
         "config": {
             "max_batch_size": settings.MAX_BATCH_SIZE,
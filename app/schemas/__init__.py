@@ -7,6 +7,7 @@ from .prediction import (
     RiskLevel,
     ConfidenceLevel,
     PredictionResponse,
+    SingleRiskResponse,
     BatchPredictionRequest,
     BatchPredictionResponse
 )
@@ -17,6 +18,7 @@ __all__ = [
     'RiskLevel',
     'ConfidenceLevel',
     'PredictionResponse',
+    'SingleRiskResponse',
     'BatchPredictionRequest',
     'BatchPredictionResponse'
 ]
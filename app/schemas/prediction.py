@@ -77,6 +77,18 @@ class PredictionResponse(BaseModel):
     )
 
 
+class SingleRiskResponse(BaseModel):
+    """Respuesta de predicción de un riesgo específico"""
+    # Sin alias_generator: las claves de primer nivel se mantienen como
+    # "prediccion" y "datos_paciente"; los modelos anidados usan sus alias
+    prediccion: RiskPrediction = Field(..., description="Predicción del riesgo solicitado")
+    datos_paciente: PatientData = Field(..., description="Datos del paciente utilizados")
+    
+    model_config = ConfigDict(
+        from_attributes=True
+    )
+
+
 class BatchPredictionRequest(BaseModel):
     """Petición de predicción por lotes"""
     pacientes: List[PatientData] = Field(..., max_length=100, description="Lista de pacientes (máximo 100)")
@@ -0,0 +1,97 @@
+"""
+Kernels numéricos para el camino de predicción
+
+Usa Numba si está instalado (extra opcional ``perf``); en caso contrario
+recurre a implementaciones equivalentes en NumPy.
+"""
+import logging
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+logger = logging.getLogger(__name__)
+
+
+def _classify_numpy(probs: np.ndarray, umbrales_riesgo: np.ndarray, umbrales_conf: np.ndarray):
+    """
+    Clasifica probabilidades en códigos de nivel de riesgo y de confianza (NumPy)
+    """
+    levels = np.select(
+        [probs >= umbrales_riesgo[2], probs >= umbrales_riesgo[1], probs >= umbrales_riesgo[0]],
+        [3, 2, 1],
+        0
+    ).astype(np.int8)
+    confidences = np.select(
+        [
+            (probs >= umbrales_conf[1]) | (probs <= 1 - umbrales_conf[1]),
+            (probs >= umbrales_conf[0]) | (probs <= 1 - umbrales_conf[0])
+        ],
+        [2, 1],
+        0
+    ).astype(np.int8)
+    return levels, confidences
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def _classify_numba(probs, umbrales_riesgo, umbrales_conf):
+        n = probs.shape[0]
+        levels = np.empty(n, dtype=np.int8)
+        confidences = np.empty(n, dtype=np.int8)
+        for i in range(n):
+            p = probs[i]
+            if p >= umbrales_riesgo[2]:
+                levels[i] = 3
+            elif p >= umbrales_riesgo[1]:
+                levels[i] = 2
+            elif p >= umbrales_riesgo[0]:
+                levels[i] = 1
+            else:
+                levels[i] = 0
+
+            if p >= umbrales_conf[1] or p <= 1.0 - umbrales_conf[1]:
+                confidences[i] = 2
+            elif p >= umbrales_conf[0] or p <= 1.0 - umbrales_conf[0]:
+                confidences[i] = 1
+            else:
+                confidences[i] = 0
+        return levels, confidences
+
+
+def classify(probs: np.ndarray, umbrales_riesgo: np.ndarray, umbrales_conf: np.ndarray):
+    """
+    Clasifica un vector de probabilidades en códigos de nivel
+
+    Args:
+        probs: Vector float64 de probabilidades
+        umbrales_riesgo: Umbrales (bajo, moderado, alto)
+        umbrales_conf: Umbrales de confianza (baja, alta)
+
+    Returns:
+        Tupla (códigos de riesgo 0-3, códigos de confianza 0-2), ambos int8
+    """
+    if NUMBA_AVAILABLE:
+        return _classify_numba(probs, umbrales_riesgo, umbrales_conf)
+    return _classify_numpy(probs, umbrales_riesgo, umbrales_conf)
+
+
+def warmup() -> None:
+    """
+    Fuerza la compilación de los kernels antes de la primera petición
+    """
+    if not NUMBA_AVAILABLE:
+        logger.info("Numba no disponible: se usan los kernels NumPy")
+        return
+
+    classify(
+        np.zeros(1, dtype=np.float64),
+        np.array([0.3, 0.5, 0.7]),
+        np.array([0.6, 0.8])
+    )
+    logger.info("✓ Kernels Numba compilados")
@@ -0,0 +1,93 @@
+"""
+Evaluación de los modelos con onnxruntime
+
+Si junto a un .joblib existe un .onnx exportado con app.utils.export_onnx y
+onnxruntime está instalado (extra opcional ``onnx``), el recorrido de los
+árboles se hace en onnxruntime. El grafo devuelve el índice de la hoja de
+cada árbol y la probabilidad se toma de las hojas del modelo de sklearn, ya
+que TreeEnsembleClassifier solo produce probabilidades en float32.
+"""
+import logging
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from app.services._tree_kernel import leaf_proba
+
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+
+logger = logging.getLogger(__name__)
+
+# Salida con el índice de hoja (opción decision_leaf de skl2onnx)
+LEAF_OUTPUT = 'decision_leaf'
+
+
+class OnnxTreeModel:
+    """
+    Sustituto de predict_proba que recorre los árboles con onnxruntime
+    """
+
+    def __init__(self, session: Any, model: Any):
+        self._session = session
+        self._input_name = session.get_inputs()[0].name
+        estimators = [model] if isinstance(model, DecisionTreeClassifier) else list(model.estimators_)
+        self._leaf_proba = [leaf_proba(estimator.tree_) for estimator in estimators]
+        self.model = model
+        self.classes_ = model.classes_
+        self.n_features_in_ = model.n_features_in_
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Probabilidades (N, n_clases) para una matriz de features escaladas
+
+        Las features se redondean a float32 igual que en sklearn y la media
+        entre árboles se acumula en el mismo orden que RandomForestClassifier.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        leaves = self._session.run([LEAF_OUTPUT], {self._input_name: X})[0].reshape(X.shape[0], -1)
+        proba = sum(table[leaves[:, t]] for t, table in enumerate(self._leaf_proba))
+        return proba / len(self._leaf_proba)
+
+
+def load_onnx_model(onnx_path: Path, model: Any) -> Optional[OnnxTreeModel]:
+    """
+    Carga el .onnx de un modelo si existe y es compatible
+
+    Args:
+        onnx_path: Ruta del archivo .onnx (junto al .joblib)
+        model: Clasificador de sklearn del que se exportó el .onnx
+
+    Returns:
+        OnnxTreeModel, o None si onnxruntime no está instalado, no hay .onnx
+        o el grafo no expone el índice de hoja o no coincide con el modelo
+    """
+    if not ONNX_AVAILABLE or not isinstance(model, (DecisionTreeClassifier, RandomForestClassifier)):
+        return None
+    if not onnx_path.exists():
+        return None
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = 1
+    session = ort.InferenceSession(str(onnx_path), sess_options=options, providers=['CPUExecutionProvider'])
+
+    if LEAF_OUTPUT not in {output.name for output in session.get_outputs()}:
+        logger.warning(f"✗ {onnx_path.name} no incluye '{LEAF_OUTPUT}': reexportar con app.utils.export_onnx")
+        return None
+
+    # Un .onnx desactualizado devolvería hojas de otro árbol: se contrasta con sklearn
+    onnx_model = OnnxTreeModel(session, model)
+    probe = np.random.default_rng(0).standard_normal((256, model.n_features_in_))
+    if not np.array_equal(onnx_model.predict_proba(probe), model.predict_proba(probe)):
+        logger.warning(f"✗ {onnx_path.name} no coincide con el modelo .joblib: se ignora")
+        return None
+
+    return onnx_model
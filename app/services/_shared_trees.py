@@ -0,0 +1,245 @@
+"""
+Almacén de los árboles compilados en memoria compartida
+
+Con varios workers de uvicorn, el primero que arranca publica los TreeArrays
+en un segmento SharedMemory y el resto lo adjunta como vistas NumPy de solo
+lectura, sin cargar los .joblib para compilar los árboles.
+
+Formato del segmento: firma (8 bytes) + longitud de la cabecera (uint64) +
+cabecera JSON + arrays alineados a 64 bytes. La firma se escribe al final,
+cuando el segmento ya está completo.
+"""
+import hashlib
+import json
+import logging
+import time
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Set
+
+import numpy as np
+
+from app.services._tree_kernel import TreeArrays
+
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"ALUNATR1"
+_HEADER_START = 16
+_ALIGNMENT = 64
+_READY_TIMEOUT = 10.0
+
+# Segmento adjuntado por este proceso y si fue este proceso quien lo creó
+_segment: Optional[SharedMemory] = None
+_owner: bool = False
+# Segmentos que no se completaron a tiempo (publicador interrumpido): no se
+# vuelve a esperar por ellos
+_stale_segments: Set[str] = set()
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def models_fingerprint(paths: Iterable[Path]) -> str:
+    """
+    Huella de los archivos de modelo (ruta, tamaño y fecha de modificación)
+
+    Evita adjuntar un segmento publicado para otros modelos (p. ej. uno que
+    quedó de una ejecución anterior).
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        stat = path.stat()
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+def _publish(name: str, trees: TreeArrays, fingerprint: str) -> SharedMemory:
+    """
+    Crea el segmento y copia los arrays (FileExistsError si ya existe)
+    """
+    entries = []
+    offset = 0
+    for field, array in zip(TreeArrays._fields, trees):
+        offset = _align(offset)
+        entries.append([field, array.dtype.str, list(array.shape), offset])
+        offset += array.nbytes
+
+    header = json.dumps({'fingerprint': fingerprint, 'arrays': entries}).encode()
+    data_start = _align(_HEADER_START + len(header))
+
+    shm = SharedMemory(name=name, create=True, size=data_start + offset, track=False)
+    try:
+        shm.buf[8:_HEADER_START] = len(header).to_bytes(8, 'little')
+        shm.buf[_HEADER_START:_HEADER_START + len(header)] = header
+        for (_, dtype, shape, array_offset), array in zip(entries, trees):
+            np.ndarray(tuple(shape), dtype=dtype, buffer=shm.buf, offset=data_start + array_offset)[...] = array
+    except Exception:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.buf[:8] = _MAGIC
+    return shm
+
+
+def _attach(name: str) -> SharedMemory:
+    """
+    Abre un segmento existente y espera a que esté completo
+
+    Raises:
+        FileNotFoundError: Si el segmento no existe
+        TimeoutError: Si el segmento no se completa a tiempo
+    """
+    deadline = time.monotonic() + _READY_TIMEOUT
+    while True:
+        try:
+            shm = SharedMemory(name=name, track=False)
+            if bytes(shm.buf[:8]) == _MAGIC:
+                return shm
+            shm.close()
+        except ValueError:
+            # Segmento recién creado que aún no tiene tamaño
+            pass
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"El segmento '{name}' no se completó en {_READY_TIMEOUT}s")
+        time.sleep(0.01)
+
+
+def _views(shm: SharedMemory, fingerprint: str) -> Optional[TreeArrays]:
+    """
+    Construye los TreeArrays como vistas de solo lectura sobre el segmento
+    """
+    header_length = int.from_bytes(shm.buf[8:_HEADER_START], 'little')
+    header = json.loads(bytes(shm.buf[_HEADER_START:_HEADER_START + header_length]))
+    if header['fingerprint'] != fingerprint:
+        return None
+
+    data_start = _align(_HEADER_START + header_length)
+    arrays = {}
+    for field, dtype, shape, offset in header['arrays']:
+        array = np.ndarray(tuple(shape), dtype=dtype, buffer=shm.buf, offset=data_start + offset)
+        array.flags.writeable = False
+        arrays[field] = array
+    return TreeArrays(**arrays)
+
+
+def attach_shared_trees(name: str, fingerprint: str) -> Optional[TreeArrays]:
+    """
+    Adjunta los árboles publicados por otro proceso, si existen
+
+    Args:
+        name: Nombre del segmento de memoria compartida
+        fingerprint: Huella de los modelos esperados (ver models_fingerprint)
+
+    Returns:
+        TreeArrays de solo lectura, o None si no hay un segmento válido
+    """
+    global _segment, _owner
+
+    # Ya adjuntado (o publicado) por este proceso: se reutiliza sin reabrirlo
+    if _segment is not None and _segment.name == name:
+        return _views(_segment, fingerprint)
+
+    if name in _stale_segments:
+        return None
+
+    try:
+        shm = _attach(name)
+    except FileNotFoundError:
+        return None
+    except TimeoutError:
+        _stale_segments.add(name)
+        logger.warning(
+            f"✗ El segmento '{name}' sigue incompleto tras {_READY_TIMEOUT}s "
+            f"(¿publicador interrumpido?): se compilan los árboles localmente"
+        )
+        return None
+
+    trees = _views(shm, fingerprint)
+    if trees is None:
+        logger.warning(f"✗ El segmento '{name}' corresponde a otros modelos: se ignora")
+        shm.close()
+        return None
+
+    _close_segment()
+    _segment, _owner = shm, False
+    logger.info(f"✓ Árboles adjuntados desde memoria compartida ('{name}')")
+    return trees
+
+
+def get_shared_trees(
+    name: str,
+    fingerprint: str,
+    build: Callable[[], Optional[TreeArrays]]
+) -> Optional[TreeArrays]:
+    """
+    Adjunta los árboles compartidos o, si no existen, los compila y publica
+
+    Args:
+        name: Nombre del segmento de memoria compartida
+        fingerprint: Huella de los modelos (ver models_fingerprint)
+        build: Función que compila los árboles localmente
+
+    Returns:
+        TreeArrays (vistas sobre el segmento si se pudo compartir), o None si
+        los modelos no son compatibles con el kernel
+    """
+    global _segment, _owner
+
+    trees = attach_shared_trees(name, fingerprint)
+    if trees is not None:
+        return trees
+
+    trees = build()
+    if trees is None or name in _stale_segments:
+        # Con un segmento abandonado no se puede publicar con el mismo nombre
+        return trees
+
+    try:
+        shm = _publish(name, trees, fingerprint)
+    except FileExistsError:
+        # Otro worker lo publicó mientras compilábamos
+        return attach_shared_trees(name, fingerprint) or trees
+    except OSError as e:
+        logger.warning(f"✗ No se pudo publicar el segmento '{name}': {str(e)}")
+        return trees
+
+    _close_segment()
+    _segment, _owner = shm, True
+    logger.info(f"✓ Árboles publicados en memoria compartida ('{name}', {shm.size} bytes)")
+    return _views(shm, fingerprint)
+
+
+def _close_segment() -> None:
+    """
+    Cierra el segmento actual sin eliminarlo (nunca hace unlink)
+    """
+    global _segment, _owner
+
+    if _segment is None:
+        return
+    try:
+        _segment.close()
+    except BufferError:
+        # Aún hay vistas vivas; el mapeo se libera cuando se recolecten
+        pass
+    _segment, _owner = None, False
+
+
+def release_shared_trees() -> None:
+    """
+    Libera el segmento adjuntado y lo elimina si lo creó este proceso
+
+    Los workers que ya lo tienen adjuntado siguen usándolo; solo desaparece el nombre.
+    """
+    global _segment, _owner
+
+    _stale_segments.clear()
+    if _segment is None:
+        return
+
+    if _owner:
+        _segment.unlink()
+        logger.info(f"✓ Segmento de memoria compartida '{_segment.name}' eliminado")
+    _close_segment()
@@ -0,0 +1,414 @@
+"""
+Evaluación compilada de los árboles de decisión
+
+Los DecisionTreeClassifier cargados (junto con su StandardScaler) se aplanan
+en arrays NumPy (un árbol por fila, rellenados hasta el mayor número de nodos)
+y se recorren con un kernel Numba que evalúa los 3 árboles para todas las
+muestras en una sola llamada.
+Si Numba no está instalado, el servicio sigue usando ``predict_proba``.
+"""
+import logging
+from typing import Any, Dict, NamedTuple, Optional, Sequence
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+logger = logging.getLogger(__name__)
+
+# Las primeras features son numéricas; el resto son indicadores 0/1 que el
+# kernel recibe empaquetados como bits de un uint8 (bit k = feature N_NUMERIC + k).
+# Entre las numéricas, todas son enteras salvo FLOAT_FEATURE (semanas_gestacion).
+N_NUMERIC = 4
+FLOAT_FEATURE = 3
+
+
+class TreeArrays(NamedTuple):
+    """
+    Representación plana de varios árboles binarios, forma (n_árboles, max_nodos)
+    """
+    features: np.ndarray      # Índice de feature de cada nodo interno (uint8)
+    thresholds: np.ndarray    # Umbral escalado (float32, ver float32_thresholds), solo en nodos de FLOAT_FEATURE
+    thresholds_q: np.ndarray  # Umbral entero exacto sin escalar (int16) para el resto de nodos
+    left: np.ndarray          # Hijo izquierdo (-1 en hojas y relleno)
+    right: np.ndarray         # Hijo derecho (-1 en hojas y relleno)
+    values: np.ndarray        # Probabilidad de la clase positiva en cada hoja
+    mean: np.ndarray          # Media del scaler de cada árbol (n_árboles, n_features)
+    scale: np.ndarray         # Escala del scaler de cada árbol (n_árboles, n_features)
+
+
+def leaf_proba(tree: Any) -> np.ndarray:
+    """
+    Probabilidad de cada clase en cada nodo, normalizada como en predict_proba
+    """
+    proba = tree.value[:, 0, :]
+    normalizer = proba.sum(axis=1)
+    normalizer[normalizer == 0.0] = 1.0
+    return proba / normalizer[:, None]
+
+
+def scaler_params(scaler: Any, n_features: int) -> Optional[tuple]:
+    """
+    Obtiene (media, escala) del scaler, o None si el kernel no puede reproducirlo
+    """
+    if scaler is None:
+        return np.zeros(n_features), np.ones(n_features)
+    if not isinstance(scaler, StandardScaler):
+        return None
+    mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+    scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+    return np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64)
+
+
+def float32_thresholds(thresholds: np.ndarray) -> np.ndarray:
+    """
+    Convierte umbrales float64 al mayor float32 que no los supera
+
+    sklearn compara la feature redondeada a float32 con el umbral float64; para
+    un float32 v, v <= t equivale a v <= t32 cuando t32 es el mayor float32
+    <= t, así que los umbrales ocupan la mitad sin cambiar ninguna decisión.
+    """
+    rounded = thresholds.astype(np.float32)
+    return np.where(rounded > thresholds, np.nextafter(rounded, np.float32(-np.inf)), rounded)
+
+
+def _quantize_thresholds(thresholds: np.ndarray, mean: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    """
+    Convierte umbrales escalados de features enteras en umbrales enteros exactos
+
+    Para x entero, float32((x - media) / escala) <= t  <=>  x <= K, donde K es
+    el mayor entero que cumple la condición. Se evalúan los candidatos cercanos
+    a t * escala + media con las mismas operaciones que sklearn.
+    """
+    approx = np.floor(thresholds * scale + mean)
+    candidates = approx[:, None] + np.arange(-2, 3)
+    scaled = ((candidates - mean[:, None]) / scale[:, None]).astype(np.float32)
+    passes = scaled <= thresholds[:, None]
+    # Mayor candidato que cumple; la condición es monótona en x
+    quantized = np.where(passes.any(axis=1), candidates.max(axis=1, where=passes, initial=-np.inf), approx - 3)
+    info = np.iinfo(np.int16)
+    return np.clip(quantized, info.min, info.max).astype(np.int16)
+
+
+def compile_trees(model_dicts: Sequence[Dict[str, Any]]) -> Optional[TreeArrays]:
+    """
+    Aplana los árboles de decisión de varios modelos en un único TreeArrays
+
+    Args:
+        model_dicts: Diccionarios de modelo ({'model', 'scaler', ...}), en el
+            orden en que se quieren las columnas de probabilidad
+
+    Returns:
+        TreeArrays, o None si algún modelo no es un árbol binario compatible
+    """
+    trees = []
+    for model_dict in model_dicts:
+        model = model_dict.get('model')
+        if not isinstance(model, DecisionTreeClassifier) or model.n_outputs_ != 1 or len(model.classes_) != 2:
+            return None
+        if not N_NUMERIC < model.n_features_in_ <= N_NUMERIC + 8:
+            return None
+
+        params = scaler_params(model_dict.get('scaler'), model.n_features_in_)
+        if params is None:
+            return None
+
+        tree = model.tree_
+        internal = tree.children_left != -1
+        node_features = np.where(internal, tree.feature, 0)
+
+        mean, scale = params
+        quantized = np.zeros(tree.node_count, dtype=np.int16)
+        integer_nodes = internal & (node_features != FLOAT_FEATURE)
+        quantized[integer_nodes] = _quantize_thresholds(
+            tree.threshold[integer_nodes],
+            mean[node_features[integer_nodes]],
+            scale[node_features[integer_nodes]]
+        )
+
+        trees.append((
+            node_features,
+            float32_thresholds(tree.threshold),
+            quantized,
+            tree.children_left,
+            tree.children_right,
+            leaf_proba(tree)[:, 1],
+            params
+        ))
+
+    n_trees = len(trees)
+    max_nodes = max(len(t[0]) for t in trees)
+    n_features = max(len(t[6][0]) for t in trees)
+    arrays = TreeArrays(
+        features=np.zeros((n_trees, max_nodes), dtype=np.uint8),
+        thresholds=np.zeros((n_trees, max_nodes), dtype=np.float32),
+        thresholds_q=np.zeros((n_trees, max_nodes), dtype=np.int16),
+        left=np.full((n_trees, max_nodes), -1, dtype=np.int32),
+        right=np.full((n_trees, max_nodes), -1, dtype=np.int32),
+        values=np.zeros((n_trees, max_nodes), dtype=np.float64),
+        mean=np.zeros((n_trees, n_features), dtype=np.float64),
+        scale=np.ones((n_trees, n_features), dtype=np.float64)
+    )
+    for t, (features, thresholds, thresholds_q, left, right, values, (mean, scale)) in enumerate(trees):
+        n_nodes = len(features)
+        arrays.features[t, :n_nodes] = features
+        arrays.thresholds[t, :n_nodes] = thresholds
+        arrays.thresholds_q[t, :n_nodes] = thresholds_q
+        arrays.left[t, :n_nodes] = left
+        arrays.right[t, :n_nodes] = right
+        arrays.values[t, :n_nodes] = values
+        arrays.mean[t, :len(mean)] = mean
+        arrays.scale[t, :len(scale)] = scale
+
+    return arrays
+
+
+def pack_features(X: np.ndarray) -> tuple:
+    """
+    Separa la matriz de features en las columnas que recibe el kernel
+
+    Args:
+        X: Matriz (N, n_features) float64 en el orden de FEATURE_NAMES
+
+    Returns:
+        Tupla (numéricas enteras (N, N_NUMERIC) int16, FLOAT_FEATURE (N,)
+        float64, indicadores (N,) uint8). La columna FLOAT_FEATURE de la
+        matriz entera no se consulta.
+    """
+    integers = X[:, :N_NUMERIC].astype(np.int16)
+    floats = np.ascontiguousarray(X[:, FLOAT_FEATURE])
+    shifts = np.arange(X.shape[1] - N_NUMERIC, dtype=np.uint8)
+    flags = np.bitwise_or.reduce(X[:, N_NUMERIC:].astype(np.uint8) << shifts, axis=1).astype(np.uint8)
+    return integers, floats, flags
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, nogil=True)
+    def _score_all(integers, floats, flags, features, thresholds, thresholds_q, left, right, values, mean, scale):
+        n_samples = integers.shape[0]
+        n_trees = features.shape[0]
+        probs = np.empty((n_samples, n_trees), dtype=np.float64)
+        for i in range(n_samples):
+            for t in range(n_trees):
+                node = 0
+                while left[t, node] != -1:
+                    f = features[t, node]
+                    if f == FLOAT_FEATURE:
+                        # Igual que sklearn: escalado en float64 y comparación en float32
+                        go_left = np.float32((floats[i] - mean[t, f]) / scale[t, f]) <= thresholds[t, node]
+                    elif f < N_NUMERIC:
+                        go_left = integers[i, f] <= thresholds_q[t, node]
+                    else:
+                        go_left = ((flags[i] >> (f - N_NUMERIC)) & 1) <= thresholds_q[t, node]
+                    if go_left:
+                        node = left[t, node]
+                    else:
+                        node = right[t, node]
+                probs[i, t] = values[t, node]
+        return probs
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, nogil=True)
+    def _predict_proba_scaled(X, features, thresholds, left, right, values):
+        n_samples = X.shape[0]
+        n_trees = features.shape[0]
+        proba = np.zeros((n_samples, values.shape[2]), dtype=np.float64)
+        for i in range(n_samples):
+            for t in range(n_trees):
+                node = 0
+                while left[t, node] != -1:
+                    if np.float32(X[i, features[t, node]]) <= thresholds[t, node]:
+                        node = left[t, node]
+                    else:
+                        node = right[t, node]
+                proba[i, :] += values[t, node, :]
+            proba[i, :] /= n_trees
+        return proba
+
+
+def score_all(X: np.ndarray, trees: TreeArrays) -> np.ndarray:
+    """
+    Evalúa todos los árboles sobre todas las muestras
+
+    Reproduce exactamente scaler.transform + predict_proba: las features
+    enteras se comparan con umbrales enteros equivalentes y FLOAT_FEATURE se
+    escala en float64 y se redondea a float32 antes de compararla.
+
+    Args:
+        X: Matriz (N, n_features) float64 sin escalar
+        trees: Árboles generados por compile_trees
+
+    Returns:
+        Matriz (N, n_árboles) con la probabilidad de la clase positiva
+    """
+    integers, floats, flags = pack_features(X)
+    return _score_all(
+        integers, floats, flags, trees.features, trees.thresholds, trees.thresholds_q, trees.left, trees.right, trees.values, trees.mean, trees.scale
+    )
+
+
+class CompiledTreeModel:
+    """
+    Sustituto compilado de predict_proba para árboles y random forests binarios
+
+    Recibe las features ya escaladas (igual que el modelo original) y
+    reproduce exactamente a sklearn: redondeo a float32, comparación con el
+    umbral y media de las probabilidades de los árboles en el mismo orden.
+    """
+
+    def __init__(self, model: Any, features: np.ndarray, thresholds: np.ndarray,
+                 left: np.ndarray, right: np.ndarray, values: np.ndarray):
+        self.model = model
+        self.classes_ = model.classes_
+        self.n_features_in_ = model.n_features_in_
+        self._arrays = (features, thresholds, left, right, values)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Probabilidades (N, 2) para una matriz de features escaladas
+        """
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        return _predict_proba_scaled(X, *self._arrays)
+
+
+def compile_model(model: Any) -> Optional[CompiledTreeModel]:
+    """
+    Compila un DecisionTreeClassifier o RandomForestClassifier binario
+
+    Args:
+        model: Clasificador de sklearn ya entrenado
+
+    Returns:
+        CompiledTreeModel, o None si Numba no está disponible o el modelo no es compatible
+    """
+    if not NUMBA_AVAILABLE:
+        return None
+    if isinstance(model, DecisionTreeClassifier):
+        estimators = [model]
+    elif isinstance(model, RandomForestClassifier):
+        estimators = list(model.estimators_)
+    else:
+        return None
+    if model.n_outputs_ != 1 or len(model.classes_) != 2:
+        return None
+
+    n_trees = len(estimators)
+    max_nodes = max(e.tree_.node_count for e in estimators)
+    features = np.zeros((n_trees, max_nodes), dtype=np.intp)
+    thresholds = np.zeros((n_trees, max_nodes), dtype=np.float32)
+    left = np.full((n_trees, max_nodes), -1, dtype=np.int32)
+    right = np.full((n_trees, max_nodes), -1, dtype=np.int32)
+    values = np.zeros((n_trees, max_nodes, 2), dtype=np.float64)
+    for t, estimator in enumerate(estimators):
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        features[t, :n_nodes] = np.where(tree.children_left != -1, tree.feature, 0)
+        thresholds[t, :n_nodes] = float32_thresholds(tree.threshold)
+        left[t, :n_nodes] = tree.children_left
+        right[t, :n_nodes] = tree.children_right
+        values[t, :n_nodes] = leaf_proba(tree)
+
+    return CompiledTreeModel(model, features, thresholds, left, right, values)
+
+
+def box_leaf_values(trees: TreeArrays, lower: np.ndarray, upper: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Comprueba si todas las muestras de una caja de features obtienen la misma probabilidad
+
+    Recorre cada árbol con la caja completa. En los nodos de features enteras
+    que la dividen se exploran ambas ramas con la caja recortada al umbral
+    entero; en FLOAT_FEATURE se evalúan los extremos con la misma aritmética
+    que el kernel (la comparación es monótona en x) y, si la caja queda
+    dividida, se exploran ambas ramas sin recortar (cota conservadora).
+
+    Args:
+        trees: Árboles generados por compile_trees
+        lower: Límite inferior (incluido) de cada feature, sin escalar
+        upper: Límite superior (incluido) de cada feature, sin escalar
+
+    Returns:
+        Probabilidad común de cada árbol, o None si alguna muestra de la caja
+        puede obtener una probabilidad distinta
+    """
+    values = np.empty(trees.features.shape[0], dtype=np.float64)
+    for t in range(trees.features.shape[0]):
+        leaf_values = set()
+        pending = [(0, lower.copy(), upper.copy())]
+        while pending:
+            node, low, high = pending.pop()
+            if trees.left[t, node] == -1:
+                leaf_values.add(trees.values[t, node])
+                continue
+
+            f = trees.features[t, node]
+            if f == FLOAT_FEATURE:
+                mean, scale = trees.mean[t, f], trees.scale[t, f]
+                threshold = trees.thresholds[t, node]
+                low_left = np.float32((low[f] - mean) / scale) <= threshold
+                high_left = np.float32((high[f] - mean) / scale) <= threshold
+                if low_left == high_left:
+                    pending.append((trees.left[t, node] if low_left else trees.right[t, node], low, high))
+                else:
+                    pending.append((trees.left[t, node], low, high))
+                    pending.append((trees.right[t, node], low, high))
+            else:
+                threshold = trees.thresholds_q[t, node]
+                if high[f] <= threshold:
+                    pending.append((trees.left[t, node], low, high))
+                elif low[f] > threshold:
+                    pending.append((trees.right[t, node], low, high))
+                else:
+                    left_high, right_low = high.copy(), low.copy()
+                    left_high[f] = threshold
+                    right_low[f] = threshold + 1
+                    pending.append((trees.left[t, node], low, left_high))
+                    pending.append((trees.right[t, node], right_low, high))
+
+        if len(leaf_values) != 1:
+            return None
+        values[t] = leaf_values.pop()
+    return values
+
+
+def warmup() -> None:
+    """
+    Fuerza la compilación del kernel con un árbol trivial de una hoja
+    """
+    if not NUMBA_AVAILABLE:
+        return
+
+    stump = TreeArrays(
+        features=np.zeros((1, 1), dtype=np.uint8),
+        thresholds=np.zeros((1, 1), dtype=np.float32),
+        thresholds_q=np.zeros((1, 1), dtype=np.int16),
+        left=np.full((1, 1), -1, dtype=np.int32),
+        right=np.full((1, 1), -1, dtype=np.int32),
+        values=np.zeros((1, 1), dtype=np.float64),
+        mean=np.zeros((1, 1), dtype=np.float64),
+        scale=np.ones((1, 1), dtype=np.float64)
+    )
+    score_all(np.zeros((1, N_NUMERIC + 1), dtype=np.float64), stump)
+
+    _predict_proba_scaled(
+        np.zeros((1, 1), dtype=np.float64),
+        stump.features.astype(np.intp),
+        stump.thresholds,
+        stump.left,
+        stump.right,
+        np.zeros((1, 1, 2), dtype=np.float64)
+    )
+
+    # Variante de solo lectura (árboles adjuntados desde memoria compartida)
+    for array in stump:
+        array.flags.writeable = False
+    score_all(np.zeros((1, N_NUMERIC + 1), dtype=np.float64), stump)
+    logger.info("✓ Kernel de árboles compilado")
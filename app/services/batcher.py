@@ -0,0 +1,154 @@
+"""
+Agrupación de peticiones individuales en micro-lotes
+
+Las peticiones a /predict que llegan casi a la vez se acumulan durante un
+máximo de MICROBATCH_MAX_WAIT_MS (o hasta MICROBATCH_MAX_SIZE pacientes) y se
+evalúan con una sola llamada vectorizada. Cada petición recibe su resultado
+a través de un asyncio.Future.
+"""
+import asyncio
+import logging
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.schemas.prediction import PatientData, PredictionResponse
+from app.services.executor import run_prediction
+from app.services.prediction_service import PredictionService
+
+
+logger = logging.getLogger(__name__)
+
+
+class DynamicBatcher:
+    """
+    Acumula pacientes en una cola y los evalúa por lotes en segundo plano
+    """
+
+    def __init__(
+        self,
+        predict_many: Callable[[List[PatientData]], Tuple[List[PredictionResponse], np.ndarray]],
+        max_batch: int,
+        max_wait_ms: float
+    ):
+        """
+        Args:
+            predict_many: Función que predice una lista de pacientes en orden y
+                devuelve (respuestas, códigos de nivel), como predict_all_risks_batch
+            max_batch: Tamaño máximo de cada lote
+            max_wait_ms: Espera máxima desde el primer paciente del lote
+        """
+        self._predict_many = predict_many
+        self._max_batch = max_batch
+        self._max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        """
+        Indica si el bucle de agrupación está activo
+        """
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """
+        Inicia el bucle de agrupación en el event loop actual
+        """
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"✓ Micro-lotes activos (máx. {self._max_batch} pacientes, {self._max_wait * 1000:g} ms)")
+
+    async def stop(self) -> None:
+        """
+        Detiene el bucle y cancela las peticiones pendientes
+        """
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+        logger.info("✓ Micro-lotes detenidos")
+
+    async def submit(self, patient_data: PatientData) -> PredictionResponse:
+        """
+        Encola un paciente y espera su predicción
+
+        Args:
+            patient_data: Datos del paciente
+
+        Returns:
+            Respuesta completa con todas las predicciones
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((patient_data, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[PatientData, asyncio.Future]]:
+        """
+        Espera el primer paciente y acumula más hasta llenar el lote o agotar la espera
+        """
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self._max_wait
+
+        while len(batch) < self._max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self) -> None:
+        """
+        Bucle principal: agrupa, predice el lote y reparte los resultados
+        """
+        while True:
+            batch = await self._collect()
+
+            # Se descartan las peticiones cuyo cliente ya no espera respuesta
+            batch = [(patient_data, future) for patient_data, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            try:
+                results, _ = await run_prediction(self._predict_many, [patient_data for patient_data, _ in batch])
+            except Exception as e:
+                logger.error(f"✗ Error en micro-lote de {len(batch)} pacientes: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+# Instancia global (se inicia en startup_event si MICROBATCH_ENABLED)
+batcher = DynamicBatcher(
+    PredictionService.predict_all_risks_batch,
+    max_batch=settings.MICROBATCH_MAX_SIZE,
+    max_wait_ms=settings.MICROBATCH_MAX_WAIT_MS
+)
@@ -0,0 +1,89 @@
+"""
+Ejecución de las predicciones fuera del event loop
+
+Por defecto las predicciones se ejecutan en el pool de hilos de asyncio
+(el kernel de árboles libera el GIL). Con PREDICTION_PROCESS_WORKERS > 0 se
+usa un ProcessPoolExecutor cuyos procesos precargan los modelos al iniciar,
+pensado para modelos más pesados cuya evaluación retiene el GIL.
+"""
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+from app.services.ml_services import ModelLoader
+from app.services.prediction_service import PredictionService
+
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _preload_models() -> None:
+    """
+    Inicializador de cada proceso: carga los modelos, compila los árboles y
+    prepara la ruta rápida
+    """
+    ModelLoader.load_all_models()
+    ModelLoader.get_compiled_trees()
+    PredictionService.get_fast_path()
+
+
+def start_executor() -> Optional[ProcessPoolExecutor]:
+    """
+    Crea el pool de procesos si está habilitado en la configuración
+
+    Returns:
+        El ProcessPoolExecutor creado, o None si se usan hilos
+    """
+    global _executor
+
+    workers = settings.PREDICTION_PROCESS_WORKERS
+    if workers <= 0 or _executor is not None:
+        return _executor
+
+    _executor = ProcessPoolExecutor(max_workers=workers, initializer=_preload_models)
+    logger.info(f"✓ Pool de procesos de predicción iniciado ({workers} procesos)")
+    return _executor
+
+
+def shutdown_executor() -> None:
+    """
+    Detiene el pool de procesos cancelando las tareas pendientes
+    """
+    global _executor
+
+    if _executor is None:
+        return
+
+    _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+    logger.info("✓ Pool de procesos de predicción detenido")
+
+
+def process_pool_active() -> bool:
+    """
+    Indica si las predicciones se ejecutan en el pool de procesos
+
+    En ese caso cada proceso tiene su propia caché de predicciones y la del
+    proceso principal no se usa.
+    """
+    return _executor is not None
+
+
+async def run_prediction(func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Ejecuta una función de predicción sin bloquear el event loop
+
+    Args:
+        func: Función a ejecutar (debe ser serializable con pickle si hay pool de procesos)
+        *args: Argumentos de la función
+
+    Returns:
+        Resultado de la función
+    """
+    if _executor is None:
+        return await asyncio.to_thread(func, *args)
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
@@ -4,21 +4,64 @@ Servicio para carga y gestión de modelos de Machine Learning
 import joblib
 import json
 import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Optional
 from functools import lru_cache
+from typing import Any, Dict, List, Optional
 
 from app.core.config import settings
+from app.services._tree_kernel import (
+    NUMBA_AVAILABLE as TREE_KERNEL_AVAILABLE,
+    TreeArrays,
+    compile_model,
+    compile_trees,
+    scaler_params
+)
+from app.services._onnx_model import load_onnx_model
+from app.services._shared_trees import (
+    attach_shared_trees,
+    get_shared_trees,
+    models_fingerprint,
+    release_shared_trees
+)
 
 
 logger = logging.getLogger(__name__)
 
 
+def _prefetch_model_file(model_path: Path) -> None:
+    """
+    Pide al sistema operativo que lea el archivo por adelantado (readahead)
+    
+    Args:
+        model_path: Ruta del archivo .joblib
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    with open(model_path, 'rb') as f:
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+
+
 class ModelLoader:
     """
     Clase para gestionar la carga y caché de modelos ML
     """
+    MODEL_NAMES = ['sepsis', 'hipertension_gestacional', 'hemorragia_posparto']
+    
     _models_cache: Dict[str, Any] = {}
+    # Un lock por modelo para que dos peticiones simultáneas no lo carguen dos veces
+    _locks: Dict[str, threading.Lock] = {}
+    _locks_guard = threading.Lock()
+    _compiled_trees: Optional[TreeArrays] = None
+    _trees_compiled: bool = False
+    # Serializa la compilación/publicación de los árboles (arranque en segundo
+    # plano y primera petición pueden llegar a la vez)
+    _trees_lock = threading.Lock()
     
     @classmethod
     def load_model(cls, model_name: str) -> Any:
@@ -37,10 +80,9 @@ class ModelLoader:
             Exception: Si hay un error al cargar el modelo
         """
         # Validar nombre del modelo
-        valid_models = ['sepsis', 'hipertension_gestacional', 'hemorragia_posparto']
-        if model_name not in valid_models:
+        if model_name not in cls.MODEL_NAMES:
             raise ValueError(
-                f"Modelo '{model_name}' no válido. Modelos disponibles: {valid_models}"
+                f"Modelo '{model_name}' no válido. Modelos disponibles: {cls.MODEL_NAMES}"
             )
         
         # Verificar si el modelo ya está en caché
@@ -48,6 +90,25 @@ class ModelLoader:
             logger.info(f"✓ Modelo '{model_name}' cargado desde caché")
             return cls._models_cache[model_name]
         
+        with cls._model_lock(model_name):
+            # Otro hilo pudo cargarlo mientras esperábamos el lock
+            if model_name in cls._models_cache:
+                return cls._models_cache[model_name]
+            return cls._load_model_file(model_name)
+    
+    @classmethod
+    def _model_lock(cls, model_name: str) -> threading.Lock:
+        """
+        Obtiene (o crea) el lock de carga de un modelo
+        """
+        with cls._locks_guard:
+            return cls._locks.setdefault(model_name, threading.Lock())
+    
+    @classmethod
+    def _load_model_file(cls, model_name: str) -> Any:
+        """
+        Lee el modelo del disco y lo guarda en caché (se llama con el lock del modelo)
+        """
         # Obtener la ruta del modelo
         model_path = settings.models_config.get(model_name)
         if not model_path:
@@ -62,6 +123,7 @@ class ModelLoader:
         try:
             # Cargar el modelo
             logger.info(f"Cargando modelo '{model_name}' desde {model_path}...")
+            _prefetch_model_file(model_path)
             model_data = joblib.load(model_path)
             
             # Intentar cargar metadata JSON si existe
@@ -84,6 +146,29 @@ class ModelLoader:
             if metadata:
                 result['metadata'] = metadata
             
+            # Media y escala del StandardScaler precalculadas para escalar sin
+            # pasar por scaler.transform (ver PredictionService.scale_features)
+            scaler = result.get('scaler')
+            if scaler is not None:
+                params = scaler_params(scaler, getattr(scaler, 'n_features_in_', 0))
+                if params is not None:
+                    result['scaler_params'] = params
+            
+            # Predictor ONNX (.onnx junto al .joblib) o compilado con Numba; lo
+            # usa predict_proba cuando no hay kernel conjunto
+            base_model = result.get('model_obj') or result.get('model')
+            try:
+                compiled = load_onnx_model(model_path.with_suffix('.onnx'), base_model) or compile_model(base_model)
+            except Exception as e:
+                logger.warning(f"✗ No se pudo compilar el modelo '{model_name}': {str(e)}")
+                compiled = None
+            if compiled is not None:
+                result['model_obj'] = compiled
+                logger.info(f"✓ Predictor {type(compiled).__name__} para '{model_name}'")
+            
+            # Método predict_proba ya enlazado del predictor final
+            result['predict_proba'] = (result.get('model_obj') or result.get('model')).predict_proba
+            
             # Guardar en caché
             cls._models_cache[model_name] = result
             
@@ -106,13 +191,16 @@ class ModelLoader:
             Exception: Si hay un error al cargar algún modelo
         """
         models = {}
-        model_names = ['sepsis', 'hipertension_gestacional', 'hemorragia_posparto']
         
         logger.info("Iniciando carga de todos los modelos...")
         
-        for model_name in model_names:
+        # Los archivos se leen en paralelo (la E/S y la deserialización liberan el GIL en parte)
+        with ThreadPoolExecutor(max_workers=len(cls.MODEL_NAMES), thread_name_prefix="model-loader") as executor:
+            futures = {model_name: executor.submit(cls.load_model, model_name) for model_name in cls.MODEL_NAMES}
+        
+        for model_name, future in futures.items():
             try:
-                models[model_name] = cls.load_model(model_name)
+                models[model_name] = future.result()
             except Exception as e:
                 logger.error(f"✗ Error al cargar modelo '{model_name}': {str(e)}")
                 raise
@@ -135,6 +223,74 @@ class ModelLoader:
             return cls.load_model(model_name)
         return cls._models_cache[model_name]
     
+    @classmethod
+    def get_compiled_trees(cls) -> Optional[TreeArrays]:
+        """
+        Obtiene los árboles de todos los modelos aplanados para el kernel compilado.
+        
+        Returns:
+            TreeArrays con una fila por modelo en el orden de MODEL_NAMES, o None
+            si Numba no está disponible o algún modelo no es un árbol compatible
+        """
+        if cls._trees_compiled:
+            return cls._compiled_trees
+        
+        with cls._trees_lock:
+            if cls._trees_compiled:
+                return cls._compiled_trees
+            
+            if TREE_KERNEL_AVAILABLE:
+                if settings.SHARED_TREES_NAME:
+                    cls._compiled_trees = get_shared_trees(
+                        settings.SHARED_TREES_NAME,
+                        models_fingerprint(settings.models_config.values()),
+                        cls._compile_trees
+                    )
+                else:
+                    cls._compiled_trees = cls._compile_trees()
+                if cls._compiled_trees is not None:
+                    logger.info(f"✓ Árboles compilados para el kernel ({cls._compiled_trees.features.shape[1]} nodos máx.)")
+                else:
+                    logger.info("Modelos no compatibles con el kernel de árboles: se usa predict_proba")
+            cls._trees_compiled = True
+        return cls._compiled_trees
+    
+    @classmethod
+    def _compile_trees(cls) -> Optional[TreeArrays]:
+        """
+        Compila los árboles a partir de los modelos (cargándolos si hace falta)
+        """
+        return compile_trees([cls.get_model(name) for name in cls.MODEL_NAMES])
+    
+    @classmethod
+    def attach_shared_trees(cls) -> bool:
+        """
+        Adjunta los árboles publicados en memoria compartida por otro worker.
+        
+        Si tiene éxito, el kernel no necesita los modelos y estos se cargan
+        bajo demanda (solo los usa la predicción de un único riesgo).
+        
+        Returns:
+            True si se adjuntaron los árboles
+        """
+        if not (TREE_KERNEL_AVAILABLE and settings.SHARED_TREES_NAME):
+            return False
+        
+        with cls._trees_lock:
+            if cls._trees_compiled:
+                return cls._compiled_trees is not None
+            
+            trees = attach_shared_trees(
+                settings.SHARED_TREES_NAME,
+                models_fingerprint(settings.models_config.values())
+            )
+            if trees is None:
+                return False
+            
+            cls._compiled_trees = trees
+            cls._trees_compiled = True
+            return True
+    
     @classmethod
     def clear_cache(cls, model_name: Optional[str] = None) -> None:
         """
@@ -143,6 +299,12 @@ class ModelLoader:
         Args:
             model_name: Nombre del modelo a limpiar. Si es None, limpia todo el caché.
         """
+        with cls._trees_lock:
+            cls._compiled_trees = None
+            cls._trees_compiled = False
+            release_shared_trees()
+        _model_file_info.cache_clear()
+        
         if model_name:
             if model_name in cls._models_cache:
                 del cls._models_cache[model_name]
@@ -157,9 +319,31 @@ class ModelLoader:
         Retorna todos los modelos actualmente en caché.
         
         Returns:
-            Diccionario con los modelos cacheados
+            Diccionario con los modelos cacheados, en el orden de MODEL_NAMES
+        """
+        cache = cls._models_cache.copy()
+        return {name: cache[name] for name in cls.MODEL_NAMES if name in cache}
+    
+    @classmethod
+    def cached_names(cls) -> List[str]:
+        """
+        Retorna los nombres de los modelos en caché sin copiar los modelos.
+        
+        Returns:
+            Lista de nombres de modelos cacheados, en el orden de MODEL_NAMES
+        """
+        # La carga en paralelo puede terminar en cualquier orden
+        return [name for name in cls.MODEL_NAMES if name in cls._models_cache]
+    
+    @classmethod
+    def cached_count(cls) -> int:
+        """
+        Retorna cuántos modelos hay en caché.
+        
+        Returns:
+            Número de modelos cacheados
         """
-        return cls._models_cache.copy()
+        return len(cls._models_cache)
     
     @classmethod
     def is_model_cached(cls, model_name: str) -> bool:
@@ -175,41 +359,42 @@ class ModelLoader:
         return model_name in cls._models_cache
 
 
-# Funciones de conveniencia para uso directo
-def load_model(model_name: str) -> Any:
-    """
-    Carga un modelo específico.
-    
-    Args:
-        model_name: Nombre del modelo ('sepsis', 'hipertension_gestacional', 'hemorragia_posparto')
-        
-    Returns:
-        El modelo cargado
-    """
-    return ModelLoader.load_model(model_name)
+# Funciones de conveniencia para uso directo (alias de los métodos de
+# ModelLoader, sin una llamada intermedia)
+load_model = ModelLoader.load_model
+load_all_models = ModelLoader.load_all_models
+get_model = ModelLoader.get_model
 
 
-def load_all_models() -> Dict[str, Any]:
+@lru_cache(maxsize=1)
+def _model_file_info() -> Dict[str, Dict[str, Any]]:
     """
-    Carga todos los modelos configurados.
+    Ruta, existencia y tamaño de cada archivo de modelo.
+    
+    Las rutas no cambian en ejecución, así que el sistema de archivos se
+    consulta una sola vez (ModelLoader.clear_cache lo vuelve a calcular).
     
     Returns:
-        Diccionario con todos los modelos cargados
+        Diccionario con la información de archivo de cada modelo
     """
-    return ModelLoader.load_all_models()
-
-
-def get_model(model_name: str) -> Any:
-    """
-    Obtiene un modelo del caché o lo carga si no está cacheado.
+    info = {}
     
-    Args:
-        model_name: Nombre del modelo
+    for model_name, model_path in settings.models_config.items():
+        # Una sola llamada a stat por archivo (exists() también hace un stat)
+        try:
+            size_mb = round(model_path.stat().st_size / (1024 * 1024), 2)
+            exists = True
+        except FileNotFoundError:
+            size_mb = None
+            exists = False
         
-    Returns:
-        El modelo solicitado
-    """
-    return ModelLoader.get_model(model_name)
+        info[model_name] = {
+            'path': str(model_path),
+            'exists': exists,
+            'size_mb': size_mb
+        }
+    
+    return info
 
 
 def get_model_info() -> Dict[str, Dict[str, Any]]:
@@ -219,14 +404,12 @@ def get_model_info() -> Dict[str, Dict[str, Any]]:
     Returns:
         Diccionario con información de cada modelo
     """
-    info = {}
-    
-    for model_name, model_path in settings.models_config.items():
-        info[model_name] = {
-            'path': str(model_path),
-            'exists': model_path.exists(),
+    return {
+        model_name: {
+            'path': file_info['path'],
+            'exists': file_info['exists'],
             'cached': ModelLoader.is_model_cached(model_name),
-            'size_mb': round(model_path.stat().st_size / (1024 * 1024), 2) if model_path.exists() else None
+            'size_mb': file_info['size_mb']
         }
-    
-    return info
+        for model_name, file_info in _model_file_info().items()
+    }
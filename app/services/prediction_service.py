@@ -3,7 +3,14 @@ Servicio de predicción de riesgos obstétricos
 """
 import numpy as np
 import logging
-from typing import Dict, List, Tuple
+import bisect
+import threading
+from functools import lru_cache
+from itertools import chain
+from operator import attrgetter
+from typing import Dict, List, Optional, Tuple
+
+from sklearn.preprocessing import StandardScaler
 
 from app.schemas.prediction import (
     PatientData,
@@ -12,12 +19,29 @@ from app.schemas.prediction import (
     RiskLevel,
     ConfidenceLevel
 )
-from app.services.ml_services import get_model
+from app.services.ml_services import ModelLoader, get_model
+from app.services._tree_kernel import box_leaf_values, score_all
+from app.services._numba_kernels import classify
 from app.core.config import settings
 
 
 logger = logging.getLogger(__name__)
 
+# Buffer (1, 8) por hilo para las features de prepare_features
+_feature_buffer = threading.local()
+
+# Umbrales como floats de Python para clasificar probabilidades sueltas sin
+# pasar por NumPy (crecientes, validados en Settings)
+_UMBRALES_RIESGO = (
+    settings.UMBRAL_RIESGO_BAJO,
+    settings.UMBRAL_RIESGO_MODERADO,
+    settings.UMBRAL_RIESGO_ALTO
+)
+_CONFIANZA_ALTA = settings.UMBRAL_CONFIANZA_ALTA
+_CONFIANZA_ALTA_INV = 1 - settings.UMBRAL_CONFIANZA_ALTA
+_CONFIANZA_BAJA = settings.UMBRAL_CONFIANZA_BAJA
+_CONFIANZA_BAJA_INV = 1 - settings.UMBRAL_CONFIANZA_BAJA
+
 
 class PredictionService:
     """
@@ -35,6 +59,7 @@ class PredictionService:
         'cesarea_previa',
         'embarazo_multiple'
     ]
+    _FEATURE_GETTER = attrgetter(*FEATURE_NAMES)
     
     # Configuración de riesgos
     RISK_TYPES = {
@@ -43,32 +68,100 @@ class PredictionService:
         'hemorragia_posparto': 'Hemorragia Posparto'
     }
     
-    @staticmethod
-    def prepare_features(patient_data: PatientData) -> np.ndarray:
+    # Niveles indexados por código entero (orden creciente de riesgo/confianza)
+    RISK_LEVELS = (RiskLevel.MUY_BAJO, RiskLevel.BAJO, RiskLevel.MODERADO, RiskLevel.ALTO)
+    CONFIDENCE_LEVELS = (ConfidenceLevel.BAJA, ConfidenceLevel.MEDIA, ConfidenceLevel.ALTA)
+    
+    # Valores de texto de RISK_LEVELS: el camino de predicción trabaja con códigos
+    # enteros y evita acceder a .value del enum
+    RISK_LEVEL_NAMES = tuple(map(attrgetter('value'), RISK_LEVELS))
+    _RISK_LEVEL_CODES = {level: code for code, level in enumerate(RISK_LEVELS)}
+    
+    # Recomendaciones por [índice de RISK_TYPES][código de nivel de RISK_LEVELS]
+    RECOMMENDATIONS = (
+        (  # sepsis
+            'Seguimiento rutinario prenatal. Medidas preventivas estándar.',
+            'Seguimiento estándar. Higiene adecuada. Educación sobre signos de infección.',
+            'Vigilancia estrecha de signos de infección. Control de temperatura cada 4 horas. Educación sobre signos de alarma.',
+            'URGENTE: Evaluación inmediata. Monitoreo intensivo de signos vitales y marcadores de infección. Considerar antibióticos profilácticos.'
+        ),
+        (  # hipertension_gestacional
+            'Seguimiento prenatal estándar. Mantener estilo de vida saludable.',
+            'Control prenatal regular con monitoreo de presión arterial. Dieta balanceada baja en sodio.',
+            'Monitoreo frecuente de presión arterial (cada 2-3 días). Control de edemas. Restricción de sal. Educación sobre signos de alarma.',
+            'URGENTE: Monitoreo continuo de presión arterial. Evaluación de preeclampsia. Posible hospitalización. Control de proteínas en orina.'
+        ),
+        (  # hemorragia_posparto
+            'Seguimiento prenatal rutinario. Parto con manejo activo del alumbramiento.',
+            'Seguimiento estándar. Asegurar manejo activo del alumbramiento. Vigilancia posparto.',
+            'Parto en centro hospitalario. Preparación de sangre disponible. Vigilancia estrecha del alumbramiento y posparto inmediato.',
+            'URGENTE: Preparación para parto en centro con banco de sangre. Disponibilidad de uterotónicos. Equipo quirúrgico en alerta.'
+        )
+    )
+    DEFAULT_RECOMMENDATION = 'Seguimiento según protocolo médico estándar'
+    _RISK_TYPE_INDEX = {risk_type: index for index, risk_type in enumerate(RISK_TYPES)}
+    
+    # Umbrales en orden creciente, en el formato que esperan los kernels
+    UMBRALES_RIESGO = np.array([
+        settings.UMBRAL_RIESGO_BAJO,
+        settings.UMBRAL_RIESGO_MODERADO,
+        settings.UMBRAL_RIESGO_ALTO
+    ])
+    UMBRALES_CONFIANZA = np.array([settings.UMBRAL_CONFIANZA_BAJA, settings.UMBRAL_CONFIANZA_ALTA])
+    
+    # Caja de pacientes sin factores de riesgo (límites incluidos, orden de FEATURE_NAMES).
+    # Solo se usa como ruta rápida si se demuestra que cada árbol la envía a una única hoja.
+    FAST_PATH_LOWER = np.array([20, 0, 6, 28.0, 0, 0, 0, 0])
+    FAST_PATH_UPPER = np.array([35, 3, 20, 40.0, 0, 0, 0, 0])
+    
+    # Resultado precalculado de la ruta rápida (se calcula una vez por proceso)
+    _fast_path: Optional[Tuple] = None
+    _fast_path_checked: bool = False
+    
+    @classmethod
+    def prepare_features(cls, patient_data: PatientData) -> np.ndarray:
         """
         Prepara las features del paciente en el formato correcto para el modelo
         
+        El array devuelto es un buffer reutilizado por cada hilo: su contenido
+        se sobrescribe en la siguiente llamada desde el mismo hilo.
+        
         Args:
             patient_data: Datos del paciente
             
         Returns:
-            Array numpy con las features en el orden correcto
-        """
-        features = np.array([[
-            patient_data.edad_materna,
-            patient_data.paridad,
-            patient_data.controles_prenatales,
-            patient_data.semanas_gestacion,
-            patient_data.hipertension_previa,
-            patient_data.diabetes_gestacional,
-            patient_data.cesarea_previa,
-            patient_data.embarazo_multiple
-        ]])
+            Array numpy (1, 8) float64 con las features en el orden correcto
+        """
+        features = getattr(_feature_buffer, 'array', None)
+        if features is None:
+            features = _feature_buffer.array = np.empty((1, len(cls.FEATURE_NAMES)), dtype=np.float64)
+        
+        features[0] = cls._FEATURE_GETTER(patient_data)
         
         return features
     
-    @staticmethod
-    def classify_risk_level(probability: float) -> RiskLevel:
+    @classmethod
+    def prepare_batch_features(cls, patients: List[PatientData]) -> np.ndarray:
+        """
+        Apila las features de varios pacientes en una única matriz
+        
+        Args:
+            patients: Lista de datos de pacientes
+            
+        Returns:
+            Matriz (N, 8) float64 con las features en el orden correcto
+        """
+        # float64, igual que prepare_features: el scaler debe recibir los valores
+        # exactos; redondear antes a float32 cambia la rama en algunos umbrales
+        n_features = len(cls.FEATURE_NAMES)
+        return np.fromiter(
+            chain.from_iterable(map(cls._FEATURE_GETTER, patients)),
+            dtype=np.float64,
+            count=len(patients) * n_features
+        ).reshape(len(patients), n_features)
+    
+    @classmethod
+    def classify_risk_level(cls, probability: float) -> RiskLevel:
         """
         Clasifica el nivel de riesgo según la probabilidad y umbrales configurados
         
@@ -78,20 +171,16 @@ class PredictionService:
         Returns:
             Nivel de riesgo clasificado
         """
-        if probability >= settings.UMBRAL_RIESGO_ALTO:
-            return RiskLevel.ALTO
-        elif probability >= settings.UMBRAL_RIESGO_MODERADO:
-            return RiskLevel.MODERADO
-        elif probability >= settings.UMBRAL_RIESGO_BAJO:
-            return RiskLevel.BAJO
-        else:
-            return RiskLevel.MUY_BAJO
+        # Número de umbrales <= probabilidad: 0 = muy bajo ... 3 = alto
+        return cls.RISK_LEVELS[bisect.bisect_right(_UMBRALES_RIESGO, probability)]
     
-    @staticmethod
-    def classify_confidence_level(probability: float, model_type: str = 'DecisionTree') -> ConfidenceLevel:
+    @classmethod
+    def classify_confidence_level(cls, probability: float, model_type: str = 'DecisionTree') -> ConfidenceLevel:
         """
         Clasifica el nivel de confianza de la predicción
         
+        Las decisiones extremas (muy cerca de 0 o 1) tienen mayor confianza.
+        
         Args:
             probability: Probabilidad predicha
             model_type: Tipo de modelo utilizado
@@ -99,16 +188,34 @@ class PredictionService:
         Returns:
             Nivel de confianza
         """
-        # Para decisiones extremas (muy cerca de 0 o 1), mayor confianza
-        if probability >= settings.UMBRAL_CONFIANZA_ALTA or probability <= (1 - settings.UMBRAL_CONFIANZA_ALTA):
+        if probability >= _CONFIANZA_ALTA or probability <= _CONFIANZA_ALTA_INV:
             return ConfidenceLevel.ALTA
-        elif probability >= settings.UMBRAL_CONFIANZA_BAJA or probability <= (1 - settings.UMBRAL_CONFIANZA_BAJA):
+        elif probability >= _CONFIANZA_BAJA or probability <= _CONFIANZA_BAJA_INV:
             return ConfidenceLevel.MEDIA
         else:
             return ConfidenceLevel.BAJA
     
-    @staticmethod
-    def generate_recommendation(risk_type: str, risk_level: RiskLevel) -> str:
+    @classmethod
+    def classify_levels(cls, probabilities: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Versión vectorizada de classify_risk_level y classify_confidence_level
+        
+        Args:
+            probabilities: Array de probabilidades de cualquier forma
+            
+        Returns:
+            Tupla (códigos de nivel de riesgo, códigos de confianza) int8 con la
+            misma forma, indexables en RISK_LEVELS y CONFIDENCE_LEVELS
+        """
+        levels, confidences = classify(
+            np.ascontiguousarray(probabilities, dtype=np.float64).ravel(),
+            cls.UMBRALES_RIESGO,
+            cls.UMBRALES_CONFIANZA
+        )
+        return levels.reshape(probabilities.shape), confidences.reshape(probabilities.shape)
+    
+    @classmethod
+    def generate_recommendation(cls, risk_type: str, risk_level: RiskLevel) -> str:
         """
         Genera recomendación basada en el tipo y nivel de riesgo
         
@@ -119,31 +226,45 @@ class PredictionService:
         Returns:
             Recomendación médica
         """
-        recommendations = {
-            'sepsis': {
-                RiskLevel.ALTO: 'URGENTE: Evaluación inmediata. Monitoreo intensivo de signos vitales y marcadores de infección. Considerar antibióticos profilácticos.',
-                RiskLevel.MODERADO: 'Vigilancia estrecha de signos de infección. Control de temperatura cada 4 horas. Educación sobre signos de alarma.',
-                RiskLevel.BAJO: 'Seguimiento estándar. Higiene adecuada. Educación sobre signos de infección.',
-                RiskLevel.MUY_BAJO: 'Seguimiento rutinario prenatal. Medidas preventivas estándar.'
-            },
-            'hipertension_gestacional': {
-                RiskLevel.ALTO: 'URGENTE: Monitoreo continuo de presión arterial. Evaluación de preeclampsia. Posible hospitalización. Control de proteínas en orina.',
-                RiskLevel.MODERADO: 'Monitoreo frecuente de presión arterial (cada 2-3 días). Control de edemas. Restricción de sal. Educación sobre signos de alarma.',
-                RiskLevel.BAJO: 'Control prenatal regular con monitoreo de presión arterial. Dieta balanceada baja en sodio.',
-                RiskLevel.MUY_BAJO: 'Seguimiento prenatal estándar. Mantener estilo de vida saludable.'
-            },
-            'hemorragia_posparto': {
-                RiskLevel.ALTO: 'URGENTE: Preparación para parto en centro con banco de sangre. Disponibilidad de uterotónicos. Equipo quirúrgico en alerta.',
-                RiskLevel.MODERADO: 'Parto en centro hospitalario. Preparación de sangre disponible. Vigilancia estrecha del alumbramiento y posparto inmediato.',
-                RiskLevel.BAJO: 'Seguimiento estándar. Asegurar manejo activo del alumbramiento. Vigilancia posparto.',
-                RiskLevel.MUY_BAJO: 'Seguimiento prenatal rutinario. Parto con manejo activo del alumbramiento.'
-            }
-        }
+        risk_index = cls._RISK_TYPE_INDEX.get(risk_type)
+        level_code = cls._RISK_LEVEL_CODES.get(risk_level)
+        if risk_index is None or level_code is None:
+            return cls.DEFAULT_RECOMMENDATION
+        return cls.RECOMMENDATIONS[risk_index][level_code]
+    
+    @staticmethod
+    def scale_features(model_dict: Dict, features: np.ndarray, copy: bool = True) -> np.ndarray:
+        """
+        Aplica el scaler del modelo a las features
         
-        return recommendations.get(risk_type, {}).get(
-            risk_level,
-            'Seguimiento según protocolo médico estándar'
-        )
+        Con StandardScaler usa la media y la escala precalculadas al cargar el
+        modelo ('scaler_params') y hace las mismas operaciones que
+        scaler.transform, (x - media) / escala en float64, por lo que el
+        resultado es idéntico bit a bit. Otros scalers usan transform.
+        
+        copy solo se respeta con StandardScaler; el transform de los demás
+        scalers no admite ese argumento y devuelve siempre un array nuevo.
+        
+        Args:
+            model_dict: Diccionario del modelo ({'model', 'scaler', ...})
+            features: Matriz (N, 8) float64
+            copy: Si es False, escala en el propio array (solo StandardScaler)
+            
+        Returns:
+            Features escaladas (las mismas si el modelo no tiene scaler)
+        """
+        params = model_dict.get('scaler_params')
+        if params is not None:
+            mean, scale = params
+            features = np.subtract(features, mean, out=None if copy else features)
+            return np.divide(features, scale, out=features)
+        
+        scaler = model_dict.get('scaler')
+        if scaler is None:
+            return features
+        if isinstance(scaler, StandardScaler):
+            return scaler.transform(features, copy=copy)
+        return scaler.transform(features)
     
     @classmethod
     def predict_single_risk(cls, patient_data: PatientData, risk_type: str) -> RiskPrediction:
@@ -159,18 +280,15 @@ class PredictionService:
         """
         # Obtener el modelo
         model_dict = get_model(risk_type)
-        model = model_dict.get('model_obj') or model_dict.get('model')
-        scaler = model_dict.get('scaler')
         
         # Preparar features
         features = cls.prepare_features(patient_data)
         
-        # Escalar si existe scaler
-        if scaler:
-            features = scaler.transform(features)
+        # Escalar si existe scaler (en el propio buffer si es un StandardScaler)
+        features = cls.scale_features(model_dict, features, copy=False)
         
         # Realizar predicción
-        probability = model.predict_proba(features)[0][1]  # Probabilidad de la clase positiva
+        probability = model_dict['predict_proba'](features)[0, 1]  # Probabilidad de la clase positiva
         
         # Clasificar nivel de riesgo
         risk_level = cls.classify_risk_level(probability)
@@ -183,7 +301,7 @@ class PredictionService:
         
         logger.info(f"Predicción {risk_type}: probabilidad={probability:.4f}, nivel={risk_level.value}")
         
-        return RiskPrediction(
+        return RiskPrediction.model_construct(
             riesgo=risk_type,
             probabilidad=round(float(probability), 4),
             nivel_riesgo=risk_level,
@@ -204,29 +322,259 @@ class PredictionService:
         """
         logger.info(f"Iniciando predicción para paciente: edad={patient_data.edad_materna}, semanas={patient_data.semanas_gestacion}")
         
-        # Realizar predicciones para cada tipo de riesgo
-        predictions = []
-        for risk_type in cls.RISK_TYPES.keys():
-            try:
-                prediction = cls.predict_single_risk(patient_data, risk_type)
-                predictions.append(prediction)
-            except Exception as e:
-                logger.error(f"Error al predecir {risk_type}: {str(e)}")
-                raise
+        key = cls.cache_key(patient_data)
+        fast_path = cls.get_fast_path()
         
-        # Generar resumen
-        summary = cls.generate_summary(predictions)
+        if fast_path is not None and cls.in_fast_path(key):
+            predictions, summary = fast_path[3], fast_path[4]
+        else:
+            # Las predicciones dependen solo de las 8 features: se reutilizan desde caché
+            predictions, summary = _predict_features_cached(key)
         
         logger.info(f"Predicción completada: {summary}")
         
-        return PredictionResponse(
-            predicciones=predictions,
-            resumen=summary,
+        return PredictionResponse.model_construct(
+            predicciones=list(predictions),
+            resumen=dict(summary),
             datos_paciente=patient_data
         )
     
+    @classmethod
+    def cache_key(cls, patient_data: PatientData) -> Tuple:
+        """
+        Construye la clave de caché de predicciones para un paciente
+        
+        La clave son los valores exactos de las features: la caché nunca cambia
+        el resultado respecto a evaluar el modelo directamente.
+        
+        Args:
+            patient_data: Datos del paciente
+            
+        Returns:
+            Tupla con las 8 features en el orden de FEATURE_NAMES
+        """
+        return cls._FEATURE_GETTER(patient_data)
+    
     @staticmethod
-    def generate_summary(predictions: List[RiskPrediction]) -> Dict:
+    def cache_info() -> Dict:
+        """
+        Retorna estadísticas de la caché de predicciones
+        
+        Returns:
+            Diccionario con aciertos, fallos, tamaño máximo y tamaño actual
+        """
+        info = _predict_features_cached.cache_info()
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'maxsize': info.maxsize,
+            'currsize': info.currsize
+        }
+    
+    @classmethod
+    def cache_clear(cls) -> None:
+        """
+        Vacía la caché de predicciones y el resultado de la ruta rápida
+        """
+        _predict_features_cached.cache_clear()
+        cls._fast_path = None
+        cls._fast_path_checked = False
+    
+    @classmethod
+    def get_fast_path(cls) -> Optional[Tuple]:
+        """
+        Obtiene el resultado precalculado para los pacientes de la caja de bajo riesgo
+        
+        La ruta rápida solo se habilita si, recorriendo los árboles compilados,
+        se comprueba que toda la caja FAST_PATH_LOWER..FAST_PATH_UPPER llega a
+        la misma hoja en los 3 modelos; así la respuesta es idéntica a la del modelo.
+        
+        Returns:
+            Tupla (probabilidades, niveles, confianzas, predicciones, resumen),
+            o None si la ruta rápida está deshabilitada o no es exacta
+        """
+        if not cls._fast_path_checked:
+            cls._fast_path = None
+            trees = ModelLoader.get_compiled_trees() if settings.ENABLE_FAST_PATH else None
+            
+            if trees is not None:
+                leaf_probs = box_leaf_values(trees, cls.FAST_PATH_LOWER, cls.FAST_PATH_UPPER)
+                if leaf_probs is not None:
+                    levels, confidences = cls.classify_levels(leaf_probs.reshape(1, -1))
+                    predictions = cls._build_predictions(leaf_probs.tolist(), levels[0].tolist(), confidences[0].tolist())
+                    summary = cls.summary_from_codes(predictions, levels[0].tolist())
+                    cls._fast_path = (leaf_probs, levels[0], confidences[0], tuple(predictions), summary)
+                    logger.info(f"✓ Ruta rápida habilitada: {cls._fast_path[4]['riesgo_general']}")
+                else:
+                    logger.info("Ruta rápida deshabilitada: los modelos no son constantes en la caja de bajo riesgo")
+            
+            cls._fast_path_checked = True
+        return cls._fast_path
+    
+    @classmethod
+    def in_fast_path(cls, features: Tuple) -> bool:
+        """
+        Indica si una tupla de features (ver cache_key) está dentro de la caja de bajo riesgo
+        """
+        return all(
+            low <= value <= high
+            for value, low, high in zip(features, cls.FAST_PATH_LOWER.tolist(), cls.FAST_PATH_UPPER.tolist())
+        )
+    
+    @classmethod
+    def score_batch(cls, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Evalúa los 3 modelos sobre una matriz de features (una llamada por modelo)
+        
+        Args:
+            features: Matriz (N, 8) generada por prepare_batch_features
+            
+        Returns:
+            Tupla (probabilidades, niveles, confianzas), cada una de forma (N, 3)
+            con columnas en el orden de RISK_TYPES
+        """
+        shape = (features.shape[0], len(cls.RISK_TYPES))
+        
+        # sklearn no acepta matrices vacías
+        if features.shape[0] == 0:
+            return np.empty(shape, dtype=np.float64), np.empty(shape, dtype=np.int8), np.empty(shape, dtype=np.int8)
+        
+        # Ruta rápida: las filas dentro de la caja de bajo riesgo no pasan por los modelos
+        fast_path = cls.get_fast_path()
+        if fast_path is None:
+            return cls._score_models(features)
+        
+        mask = ((features >= cls.FAST_PATH_LOWER) & (features <= cls.FAST_PATH_UPPER)).all(axis=1)
+        if not mask.any():
+            return cls._score_models(features)
+        
+        probabilities = np.empty(shape, dtype=np.float64)
+        levels = np.empty(shape, dtype=np.int8)
+        confidences = np.empty(shape, dtype=np.int8)
+        probabilities[mask], levels[mask], confidences[mask] = fast_path[:3]
+        
+        rest = ~mask
+        if rest.any():
+            probabilities[rest], levels[rest], confidences[rest] = cls._score_models(features[rest])
+        
+        return probabilities, levels, confidences
+    
+    @classmethod
+    def _score_models(cls, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Evalúa los modelos sobre una matriz de features no vacía (ver score_batch)
+        """
+        probabilities = np.empty((features.shape[0], len(cls.RISK_TYPES)), dtype=np.float64)
+        
+        # Kernel compilado: los 3 árboles en una sola pasada
+        trees = ModelLoader.get_compiled_trees()
+        if trees is not None:
+            probabilities = score_all(features, trees)
+        else:
+            for column, risk_type in enumerate(cls.RISK_TYPES):
+                model_dict = get_model(risk_type)
+                
+                X = cls.scale_features(model_dict, features)
+                probabilities[:, column] = model_dict['predict_proba'](X)[:, 1]
+        
+        levels, confidences = cls.classify_levels(probabilities)
+        
+        return probabilities, levels, confidences
+    
+    @classmethod
+    def build_batch_responses(
+        cls,
+        patients: List[PatientData],
+        probabilities: np.ndarray,
+        levels: np.ndarray,
+        confidences: np.ndarray
+    ) -> List[PredictionResponse]:
+        """
+        Construye las respuestas a partir de los resultados de score_batch
+        
+        Args:
+            patients: Lista de datos de pacientes
+            probabilities: Probabilidades (N, 3)
+            levels: Códigos de nivel de riesgo (N, 3)
+            confidences: Códigos de nivel de confianza (N, 3)
+            
+        Returns:
+            Lista de respuestas, una por paciente
+        """
+        predictions = [
+            cls._build_predictions(probs_row, levels_row, conf_row)
+            for probs_row, levels_row, conf_row in zip(
+                probabilities.tolist(), levels.tolist(), confidences.tolist()
+            )
+        ]
+        
+        # El resumen se calcula con las probabilidades ya redondeadas de cada predicción
+        rounded = np.fromiter(
+            (pred.probabilidad for row in predictions for pred in row),
+            dtype=np.float64,
+            count=levels.size
+        ).reshape(levels.shape)
+        summaries = cls.summaries_from_codes(tuple(cls.RISK_TYPES), rounded, levels)
+        
+        return [
+            PredictionResponse.model_construct(
+                predicciones=row,
+                resumen=summary,
+                datos_paciente=patient_data
+            )
+            for patient_data, row, summary in zip(patients, predictions, summaries)
+        ]
+    
+    @classmethod
+    def _build_predictions(
+        cls,
+        probs_row: List[float],
+        levels_row: List[int],
+        conf_row: List[int]
+    ) -> List[RiskPrediction]:
+        """
+        Construye las predicciones de los 3 riesgos a partir de una fila de resultados
+        
+        Las respuestas las genera el propio servicio a partir de datos ya
+        validados, por lo que se construyen con model_construct (sin validación).
+        """
+        return [
+            RiskPrediction.model_construct(
+                riesgo=risk_type,
+                probabilidad=round(probability, 4),
+                nivel_riesgo=cls.RISK_LEVELS[level],
+                nivel_confianza=cls.CONFIDENCE_LEVELS[confidence],
+                recomendacion=recommendations[level]
+            )
+            for risk_type, recommendations, probability, level, confidence in zip(
+                cls.RISK_TYPES, cls.RECOMMENDATIONS, probs_row, levels_row, conf_row
+            )
+        ]
+    
+    @classmethod
+    def predict_all_risks_batch(
+        cls,
+        patients: List[PatientData]
+    ) -> Tuple[List[PredictionResponse], np.ndarray]:
+        """
+        Realiza predicción de todos los riesgos para varios pacientes a la vez
+        
+        Args:
+            patients: Lista de datos de pacientes
+            
+        Returns:
+            Tupla (respuestas completas en el mismo orden que patients, códigos
+            de nivel de riesgo (N, 3) para calcular estadísticas del lote)
+        """
+        logger.info(f"Iniciando predicción por lote: {len(patients)} pacientes")
+        
+        features = cls.prepare_batch_features(patients)
+        probabilities, levels, confidences = cls.score_batch(features)
+        
+        return cls.build_batch_responses(patients, probabilities, levels, confidences), levels
+    
+    @classmethod
+    def generate_summary(cls, predictions: List[RiskPrediction]) -> Dict:
         """
         Genera resumen general de las predicciones
         
@@ -236,53 +584,104 @@ class PredictionService:
         Returns:
             Diccionario con resumen
         """
-        # Contar riesgos por nivel
-        risk_counts = {
-            'alto': 0,
-            'moderado': 0,
-            'bajo': 0,
-            'muy_bajo': 0
-        }
+        return cls.summary_from_codes(
+            predictions,
+            [cls._RISK_LEVEL_CODES[pred.nivel_riesgo] for pred in predictions]
+        )
+    
+    @classmethod
+    def summary_from_codes(cls, predictions: List[RiskPrediction], levels_row: List[int]) -> Dict:
+        """
+        Genera el resumen a partir de los códigos de nivel de riesgo ya calculados
         
-        max_probability = 0.0
-        max_risk = None
-        
-        for pred in predictions:
-            risk_counts[pred.nivel_riesgo.value] += 1
-            if pred.probabilidad > max_probability:
-                max_probability = pred.probabilidad
-                max_risk = pred.riesgo
-        
-        # Determinar riesgo general
-        if risk_counts['alto'] > 0:
-            general_risk = 'alto'
-        elif risk_counts['moderado'] > 0:
-            general_risk = 'moderado'
-        elif risk_counts['bajo'] > 0:
-            general_risk = 'bajo'
-        else:
-            general_risk = 'muy_bajo'
+        Args:
+            predictions: Lista de predicciones
+            levels_row: Código de nivel de riesgo (0-3) de cada predicción
+            
+        Returns:
+            Diccionario con resumen
+        """
+        probabilities = np.fromiter(
+            (pred.probabilidad for pred in predictions),
+            dtype=np.float64,
+            count=len(predictions)
+        )
+        return cls.summaries_from_codes(
+            tuple(pred.riesgo for pred in predictions),
+            probabilities.reshape(1, -1),
+            np.asarray(levels_row, dtype=np.int8).reshape(1, -1)
+        )[0]
+    
+    @classmethod
+    def summaries_from_codes(
+        cls,
+        risk_names: Tuple[str, ...],
+        probabilities: np.ndarray,
+        levels: np.ndarray
+    ) -> List[Dict]:
+        """
+        Genera los resúmenes de varios pacientes con reducciones vectorizadas
         
-        return {
-            'riesgo_general': general_risk,
-            'total_riesgos_altos': risk_counts['alto'],
-            'total_riesgos_moderados': risk_counts['moderado'],
-            'total_riesgos_bajos': risk_counts['bajo'],
-            'requiere_atencion_especial': risk_counts['alto'] > 0 or risk_counts['moderado'] >= 2,
-            'riesgo_mas_alto': max_risk,
-            'probabilidad_mas_alta': round(max_probability, 4)
-        }
+        Args:
+            risk_names: Nombre del riesgo de cada columna
+            probabilities: Probabilidades redondeadas (N, K), como en las predicciones
+            levels: Códigos de nivel de riesgo (N, K)
+            
+        Returns:
+            Lista de N diccionarios de resumen
+        """
+        n_rows = levels.shape[0]
+        
+        # Contar riesgos por código de nivel (muy_bajo, bajo, moderado, alto)
+        counts = (levels[:, :, None] == np.arange(len(cls.RISK_LEVELS))).sum(axis=1)
+        
+        # Riesgo más probable: una columna inicial a 0 hace que argmax devuelva
+        # el primer máximo estrictamente positivo (o ninguno si todos son 0)
+        padded = np.concatenate([np.zeros((n_rows, 1)), probabilities], axis=1)
+        top = padded.argmax(axis=1)
+        top_probabilities = padded[np.arange(n_rows), top]
+        names = (None,) + tuple(risk_names)
+        
+        # Riesgo general = nivel más alto entre los riesgos
+        general = levels.max(axis=1, initial=0)
+        
+        return [
+            {
+                'riesgo_general': cls.RISK_LEVEL_NAMES[general_code],
+                'total_riesgos_altos': altos,
+                'total_riesgos_moderados': moderados,
+                'total_riesgos_bajos': bajos,
+                'requiere_atencion_especial': altos > 0 or moderados >= 2,
+                'riesgo_mas_alto': names[top_column],
+                'probabilidad_mas_alta': top_probability
+            }
+            for general_code, (_, bajos, moderados, altos), top_column, top_probability in zip(
+                general.tolist(), counts.tolist(), top.tolist(), top_probabilities.tolist()
+            )
+        ]
 
 
-# Función de conveniencia
-def predict_patient_risks(patient_data: PatientData) -> PredictionResponse:
+@lru_cache(maxsize=settings.PREDICTION_CACHE_SIZE)
+def _predict_features_cached(features: Tuple) -> Tuple[Tuple[RiskPrediction, ...], Dict]:
     """
-    Función de conveniencia para realizar predicción completa
+    Predice los 3 riesgos para una tupla de features (memoizado)
     
     Args:
-        patient_data: Datos del paciente
+        features: Clave generada por PredictionService.cache_key
         
     Returns:
-        Respuesta con todas las predicciones
+        Tupla (predicciones, resumen); no deben modificarse porque se comparten
+        entre respuestas
     """
-    return PredictionService.predict_all_risks(patient_data)
+    probabilities, levels, confidences = PredictionService.score_batch(
+        np.asarray([features], dtype=np.float64)
+    )
+    levels_row = levels[0].tolist()
+    predictions = PredictionService._build_predictions(
+        probabilities[0].tolist(), levels_row, confidences[0].tolist()
+    )
+    return tuple(predictions), PredictionService.summary_from_codes(predictions, levels_row)
+
+
+# Función de conveniencia (alias de PredictionService.predict_all_risks)
+predict_patient_risks = PredictionService.predict_all_risks
@@ -0,0 +1,58 @@
+"""
+Exporta los modelos configurados a ONNX
+
+Genera un .onnx junto a cada .joblib para que ModelLoader los evalúe con
+onnxruntime. Requiere el extra opcional ``onnx`` (skl2onnx y onnxruntime).
+
+Uso:
+    python -m app.utils.export_onnx
+"""
+import logging
+
+import joblib
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType
+
+from app.core.config import settings
+from app.services._onnx_model import LEAF_OUTPUT
+
+
+logger = logging.getLogger(__name__)
+
+
+def export_model(model_name: str) -> None:
+    """
+    Exporta el clasificador de un modelo a un .onnx junto a su .joblib
+
+    El grafo recibe las features ya escaladas (el StandardScaler se sigue
+    aplicando en Python) y expone el índice de hoja de cada árbol.
+
+    Args:
+        model_name: Nombre del modelo ('sepsis', 'hipertension_gestacional', 'hemorragia_posparto')
+    """
+    model_path = settings.models_config[model_name]
+    model_data = joblib.load(model_path)
+    model = model_data['model'] if isinstance(model_data, dict) else model_data
+
+    onnx_model = convert_sklearn(
+        model,
+        initial_types=[('input', FloatTensorType([None, model.n_features_in_]))],
+        options={id(model): {'zipmap': False, LEAF_OUTPUT: True}}
+    )
+
+    onnx_path = model_path.with_suffix('.onnx')
+    onnx_path.write_bytes(onnx_model.SerializeToString())
+    logger.info(f"✓ Modelo '{model_name}' exportado a {onnx_path}")
+
+
+def main() -> None:
+    """
+    Exporta todos los modelos configurados
+    """
+    logging.basicConfig(level=settings.LOG_LEVEL, format='%(message)s')
+    for model_name in settings.models_config:
+        export_model(model_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.core.config import settings
 from app.core.events import startup_event, shutdown_event
@@ -39,7 +40,8 @@ app = FastAPI(
     title=settings.API_TITLE,
     description=settings.API_DESCRIPTION,
     version=settings.API_VERSION,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configurar CORS
@@ -74,26 +76,57 @@ async def health_check():
     """
     from app.services.ml_services import ModelLoader
     
-    cached_models = ModelLoader.get_cached_models()
+    cached_names = ModelLoader.cached_names()
     
     return {
         "status": "healthy",
-        "models_loaded": len(cached_models),
-        "models": list(cached_models.keys())
+        "models_loaded": len(cached_names),
+        "models": cached_names
     }
 
 
+@app.get("/health/cache")
+async def cache_health():
+    """
+    Estadísticas de la caché de predicciones
+    """
+    from app.services.executor import process_pool_active
+    from app.services.prediction_service import PredictionService
+    
+    # Con el pool de procesos la caché vive en cada proceso, no en este
+    if process_pool_active():
+        return {
+            "status": "unavailable",
+            "detail": "Las predicciones se ejecutan en el pool de procesos (PREDICTION_PROCESS_WORKERS > 0); cada proceso tiene su propia caché"
+        }
+    
+    return PredictionService.cache_info()
+
+
 def main():
     """
     Función principal para ejecutar la aplicación
     """
     import uvicorn
     
+    # uvloop y httptools vienen con uvicorn[standard]; uvloop no existe en Windows
+    try:
+        import uvloop  # noqa: F401
+        loop = "uvloop"
+    except ImportError:
+        loop = "asyncio"
+    
+    # La recarga automática solo en desarrollo (uvicorn la hace incompatible con workers)
+    reload = settings.ENVIRONMENT == "development"
+    
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        reload=reload,
+        workers=None if reload else settings.WEB_CONCURRENCY,
+        loop=loop,
+        http="httptools",
         log_level=settings.LOG_LEVEL.lower()
     )
 
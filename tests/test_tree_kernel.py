@@ -0,0 +1,203 @@
+"""
+Exactitud del kernel de árboles frente a DecisionTreeClassifier.predict_proba
+
+El kernel compilado, la ruta rápida (box_leaf_values) y los árboles adjuntados
+desde memoria compartida sustituyen a scaler.transform + predict_proba, así que
+deben dar exactamente las mismas probabilidades, en especial con valores de
+semanas_gestacion justo en los umbrales de los árboles.
+
+Ejecutar con: python -m unittest discover -s tests
+(importar app.services valida la configuración, así que necesita los modelos
+en modelos_entrenados/ o en MODELS_DIR, igual que la API)
+"""
+import contextlib
+import itertools
+import os
+import unittest
+from multiprocessing.shared_memory import SharedMemory
+from unittest import mock
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from app.services import _shared_trees
+from app.services._tree_kernel import (
+    FLOAT_FEATURE,
+    N_NUMERIC,
+    NUMBA_AVAILABLE,
+    TreeArrays,
+    box_leaf_values,
+    compile_trees,
+    score_all
+)
+
+
+def _random_patients(rng: np.random.Generator, n: int) -> np.ndarray:
+    """
+    Pacientes aleatorios en el orden de FEATURE_NAMES
+    """
+    return np.column_stack([
+        rng.integers(15, 61, n),
+        rng.integers(0, 21, n),
+        rng.integers(0, 21, n),
+        np.round(rng.uniform(4, 45, n), 1),
+        rng.integers(0, 2, n),
+        rng.integers(0, 2, n),
+        rng.integers(0, 2, n),
+        rng.integers(0, 2, n)
+    ]).astype(np.float64)
+
+
+class TreeKernelExactnessTest(unittest.TestCase):
+    """
+    Compara cada ruta del kernel con sklearn sobre valores frontera
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(0)
+        X = _random_patients(rng, 5000)
+
+        cls.models = []
+        for i in range(3):
+            logit = (
+                0.05 * (X[:, 0] - 30) + 0.8 * X[:, N_NUMERIC + i] - 0.1 * X[:, 2]
+                + 0.05 * (X[:, FLOAT_FEATURE] - 30) * (i - 1) + rng.normal(0, 1, len(X))
+            )
+            scaler = StandardScaler().fit(X)
+            model = DecisionTreeClassifier(max_depth=8, min_samples_leaf=20, random_state=i)
+            model.fit(scaler.transform(X), (logit > 0).astype(int))
+            cls.models.append({'model': model, 'scaler': scaler})
+
+        cls.trees = compile_trees(cls.models)
+        boundaries = cls._boundary_semanas()
+        cls.X = _random_patients(rng, len(boundaries) * 4)
+        cls.X[:, FLOAT_FEATURE] = np.tile(boundaries, 4)
+        cls.reference = cls._predict_proba(cls.X)
+
+    @classmethod
+    def _predict_proba(cls, X: np.ndarray) -> np.ndarray:
+        return np.column_stack([
+            m['model'].predict_proba(m['scaler'].transform(X))[:, 1] for m in cls.models
+        ])
+
+    @classmethod
+    def _boundary_semanas(cls) -> np.ndarray:
+        """
+        Valores de semanas_gestacion en (y alrededor de) cada umbral de los árboles
+        """
+        semanas = [np.round(np.arange(4.0, 45.05, 0.1), 1)]
+        for m in cls.models:
+            tree = m['model'].tree_
+            nodes = (tree.children_left != -1) & (tree.feature == FLOAT_FEATURE)
+            raw = (
+                tree.threshold[nodes] * m['scaler'].scale_[FLOAT_FEATURE]
+                + m['scaler'].mean_[FLOAT_FEATURE]
+            )
+            below, above = np.nextafter(raw, -np.inf), np.nextafter(raw, np.inf)
+            semanas += [
+                raw, below, above, np.nextafter(below, -np.inf), np.nextafter(above, np.inf),
+                np.round(raw, 1), np.round(raw, 1) - 0.1, np.round(raw, 1) + 0.1, np.round(raw, 2)
+            ]
+        return np.concatenate(semanas)
+
+    def test_compile_trees_accepts_models(self):
+        self.assertIsNotNone(self.trees)
+
+    @unittest.skipUnless(NUMBA_AVAILABLE, "requiere Numba (extra perf)")
+    def test_score_all_matches_predict_proba(self):
+        np.testing.assert_array_equal(score_all(self.X, self.trees), self.reference)
+
+    def test_box_leaf_values_matches_predict_proba(self):
+        rng = np.random.default_rng(1)
+        proven = 0
+        # Cajas que empiezan o terminan exactamente en cada valor frontera
+        for row in self.X:
+            lower, upper = row.copy(), row.copy()
+            lower[:FLOAT_FEATURE] -= rng.integers(0, 2, FLOAT_FEATURE)
+            upper[:FLOAT_FEATURE] += rng.integers(0, 2, FLOAT_FEATURE)
+            width = rng.choice([0.0, 0.0, 0.1, 0.5])
+            if rng.random() < 0.5:
+                upper[FLOAT_FEATURE] += width
+            else:
+                lower[FLOAT_FEATURE] -= width
+
+            values = box_leaf_values(self.trees, lower, upper)
+            if values is None:
+                continue
+            proven += 1
+
+            # Todas las combinaciones enteras con semanas en los extremos y en la rejilla de 0.1
+            low_f, high_f = lower[FLOAT_FEATURE], upper[FLOAT_FEATURE]
+            semanas = np.unique(np.concatenate([
+                [low_f, high_f, np.nextafter(low_f, np.inf), np.nextafter(high_f, -np.inf)],
+                np.round(np.arange(low_f, high_f, 0.1), 1)
+            ]))
+            semanas = semanas[(semanas >= low_f) & (semanas <= high_f)]
+            ranges = [np.arange(lower[f], upper[f] + 1) for f in range(FLOAT_FEATURE)]
+            samples = np.array([
+                [*ints, s, *row[N_NUMERIC:]]
+                for ints in itertools.product(*ranges)
+                for s in semanas
+            ])
+            np.testing.assert_array_equal(
+                self._predict_proba(samples),
+                np.broadcast_to(values, (len(samples), len(values)))
+            )
+
+        self.assertGreater(proven, 0)
+
+    def test_attached_shared_trees_match(self):
+        name = f"aluna_test_{os.getpid()}"
+        fingerprint = 'test'
+        published = _shared_trees.get_shared_trees(name, fingerprint, lambda: self.trees)
+        owner_segment = _shared_trees._segment
+        self.assertTrue(_shared_trees._owner)
+        try:
+            # Como un worker que no publicó: attach abre el segmento por su nombre
+            _shared_trees._segment, _shared_trees._owner = None, False
+            attached = _shared_trees.attach_shared_trees(name, fingerprint)
+            self.assertIsNotNone(attached)
+            for field, expected, actual in zip(TreeArrays._fields, self.trees, attached):
+                np.testing.assert_array_equal(actual, expected, err_msg=field)
+                self.assertFalse(actual.flags.writeable)
+            if NUMBA_AVAILABLE:
+                np.testing.assert_array_equal(score_all(self.X, attached), self.reference)
+
+            # Un segmento publicado para otros modelos no se adjunta
+            self.assertIsNone(_shared_trees.attach_shared_trees(name, 'otros modelos'))
+        finally:
+            published = attached = None
+            _shared_trees._close_segment()
+            owner_segment.unlink()
+            with contextlib.suppress(BufferError):
+                owner_segment.close()
+
+    def test_incomplete_segment_is_waited_for_once(self):
+        name = f"aluna_test_stale_{os.getpid()}"
+        # Segmento sin firma, como el que deja un publicador interrumpido
+        stale = SharedMemory(name=name, create=True, size=64, track=False)
+        builds = []
+
+        def build():
+            builds.append(1)
+            return self.trees
+
+        try:
+            with mock.patch.object(_shared_trees, '_READY_TIMEOUT', 0.2), \
+                    mock.patch.object(_shared_trees, '_attach', wraps=_shared_trees._attach) as attach:
+                trees = _shared_trees.get_shared_trees(name, 'test', build)
+                self.assertIs(trees, self.trees)
+                self.assertEqual(len(builds), 1)
+                self.assertIsNone(_shared_trees.attach_shared_trees(name, 'test'))
+                # Una sola espera: después el segmento se da por abandonado
+                self.assertEqual(attach.call_count, 1)
+        finally:
+            _shared_trees.release_shared_trees()
+            stale.close()
+            stale.unlink()
+
+
+if __name__ == '__main__':
+    unittest.main()